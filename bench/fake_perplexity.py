@@ -0,0 +1,162 @@
+# Local stand-in for the Perplexity chat completions API, for benchmarks
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+from typing import Any, Dict
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+COORDINATES = re.compile(r"coordinates\s+(-?\d+(?:\.\d+)?),\s*(-?\d+(?:\.\d+)?)")
+ERROR_STATUSES = (429, 500, 502, 503)
+
+
+class FakeSettings:
+    def __init__(self,
+                 latency_median: float = 1.5,
+                 latency_sigma: float = 0.5,
+                 latency_max: float = 30,
+                 error_rate: float = 0.0,
+                 empty_rate: float = 0.0,
+                 items: int = 5,
+                 seed: int = 0):
+        """Latency is log-normal around `latency_median` seconds; errors and empty results are drawn per call."""
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.latency_max = latency_max
+        self.error_rate = error_rate
+        self.empty_rate = empty_rate
+        self.items = items
+        self.random = random.Random(seed)
+
+    def latency(self) -> float:
+        if self.latency_median <= 0:
+            return 0.0
+        return min(self.random.lognormvariate(0, self.latency_sigma) * self.latency_median, self.latency_max)
+
+
+def call_kind(payload: Dict[str, Any]) -> str:
+    """Classify a request the way the app uses the upstream, for per-kind call counts."""
+    prompt = payload["messages"][-1]["content"]
+    schema = payload.get("response_format", {}).get("json_schema", {}).get("schema", {})
+    properties = schema.get("properties", {})
+    if "locations" in properties:
+        return "resolve-locations"
+    if properties:
+        kind = "search-local" if prompt.startswith("Find information about") else "local-data"
+        return f"{kind}-stream" if payload.get("stream") else kind
+    if "partial search query" in prompt:
+        return "search-suggestions"
+    if payload.get("model") == "sonar-reasoning":
+        return "location-insights"
+    return "other"
+
+
+def fake_value(schema: Dict[str, Any], field: str, index: int, center: tuple, rng: random.Random, items: int) -> Any:
+    """Generate a value matching a JSON schema, using the field name to pick plausible content."""
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: fake_value(sub, name, index, center, rng, items) for name, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [fake_value(schema.get("items", {}), field, i, center, rng, items) for i in range(items)]
+    if kind == "integer":
+        return index
+    if kind == "number":
+        if field == "latitude":
+            return round(center[0] + rng.uniform(-0.01, 0.01), 6)
+        if field == "longitude":
+            return round(center[1] + rng.uniform(-0.01, 0.01), 6)
+        return round(rng.uniform(1, 5), 1)
+    samples = {
+        "id": f"bench-{index}-{rng.randrange(10 ** 6)}",
+        "name": f"Bench Place {rng.randrange(1000)}",
+        "title": f"Bench Alert {rng.randrange(1000)}",
+        "address": f"{rng.randrange(1, 999)} Bench St",
+        "date": "2026-01-01",
+        "time": "7:00 PM",
+        "url": "https://example.com",
+        "website": "https://example.com"
+    }
+    return samples.get(field, f"Bench {field} {index}")
+
+
+def fake_content(payload: Dict[str, Any], settings: FakeSettings) -> str:
+    prompt = payload["messages"][-1]["content"]
+    match = COORDINATES.search(prompt)
+    center = (float(match.group(1)), float(match.group(2))) if match else (30.59, -97.86)
+    # Same prompt, same places, so repeated calls look like one neighborhood
+    rng = random.Random(prompt)
+    schema = payload.get("response_format", {}).get("json_schema", {}).get("schema")
+    if schema:
+        items = 0 if settings.random.random() < settings.empty_rate else settings.items
+        return json.dumps(fake_value(schema, "", 0, center, rng, items))
+    if "partial search query" in prompt:
+        query = re.search(r'query "([^"]*)"', prompt)
+        stem = query.group(1) if query else "coffee"
+        return json.dumps([f"{stem} near me", f"best {stem}", f"{stem} open now", f"cheap {stem}", f"{stem} tonight"])
+    return "1. **Best Times to Visit** - Weekday mornings.\n2. **What to Try** - The house special.\n" * 8
+
+
+def create_app(settings: FakeSettings) -> Starlette:
+    calls: Counter = Counter()
+    started = time.time()
+
+    async def completions(request: Request) -> Response:
+        payload = await request.json()
+        calls[call_kind(payload)] += 1
+        await asyncio.sleep(settings.latency())
+        if settings.random.random() < settings.error_rate:
+            status = settings.random.choice(ERROR_STATUSES)
+            return JSONResponse({"error": {"message": "injected failure"}}, status_code=status)
+        content = fake_content(payload, settings)
+        citations = ["https://example.com/bench"]
+        if not payload.get("stream"):
+            return JSONResponse({"choices": [{"message": {"content": content}}], "citations": citations})
+
+        async def chunks():
+            for i in range(0, len(content), 40):
+                yield f"data: {json.dumps({'choices': [{'delta': {'content': content[i:i + 40]}}]})}\n\n"
+                await asyncio.sleep(0.005)
+            yield f"data: {json.dumps({'choices': [{'delta': {}}], 'citations': citations})}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    async def stats(request: Request) -> Response:
+        return JSONResponse({"calls": sum(calls.values()), "by_kind": dict(calls), "uptime": time.time() - started})
+
+    async def reset(request: Request) -> Response:
+        calls.clear()
+        return JSONResponse({"calls": 0})
+
+    return Starlette(routes=[
+        Route("/chat/completions", completions, methods=["POST"]),
+        Route("/stats", stats),
+        Route("/reset", reset, methods=["POST"])
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Perplexity chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-median", type=float, default=1.5, help="median upstream latency in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal sigma of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 429/5xx")
+    parser.add_argument("--empty-rate", type=float, default=0.0, help="fraction of structured calls with empty arrays")
+    parser.add_argument("--items", type=int, default=5, help="items per array in structured responses")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    settings = FakeSettings(args.latency_median, args.latency_sigma, error_rate=args.error_rate,
+                            empty_rate=args.empty_rate, items=args.items, seed=args.seed)
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# Load scenarios against a running CityPulse app, reporting throughput, latency and upstream calls
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlencode
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUERIES = ["coffee shops", "live music tonight", "tacos", "parking downtown", "farmers market",
+           "happy hour specials", "pizza delivery", "art galleries", "brunch", "hiking trails"]
+VENUE_TYPES = ["restaurant", "event", "alert"]
+
+
+class Locations:
+    def __init__(self, count: int, seed: int, center: tuple = (30.59, -97.86), spread: float = 0.2):
+        """A fixed pool of locations picked with a skewed (Zipf-like) distribution, like real traffic."""
+        rng = random.Random(seed)
+        self.points = [(round(center[0] + rng.uniform(-spread, spread), 5),
+                        round(center[1] + rng.uniform(-spread, spread), 5)) for _ in range(count)]
+        self.weights = [1 / (rank + 1) for rank in range(count)]
+        self.random = rng
+
+    def pick(self) -> tuple:
+        return self.random.choices(self.points, self.weights)[0]
+
+
+def scenario_paths(locations: Locations) -> Dict[str, Callable[[], str]]:
+    rng = locations.random
+
+    def local_data():
+        lat, lng = locations.pick()
+        return "/api/local-data?" + urlencode({"lat": lat, "lng": lng})
+
+    def search_local():
+        lat, lng = locations.pick()
+        return "/api/search-local?" + urlencode({"lat": lat, "lng": lng, "query": rng.choice(QUERIES)})
+
+    def search_suggestions():
+        lat, lng = locations.pick()
+        query = rng.choice(QUERIES)
+        return "/api/search-suggestions?" + urlencode({"lat": lat, "lng": lng, "query": query[:rng.randint(4, len(query))]})
+
+    def location_insights():
+        venue = rng.randrange(50)
+        return "/api/location-insights?" + urlencode({
+            "name": f"Bench Place {venue}", "type": VENUE_TYPES[venue % 3],
+            "description": "A benchmark venue", "address": f"{venue} Bench St"
+        })
+
+    return {
+        "landing": lambda: "/",
+        "local-data": local_data,
+        "search-local": search_local,
+        "search-suggestions": search_suggestions,
+        "location-insights": location_insights
+    }
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+async def upstream_calls(client: httpx.AsyncClient, fake_url: Optional[str]) -> Optional[int]:
+    if not fake_url:
+        return None
+    return (await client.get(f"{fake_url}/stats")).json()["calls"]
+
+
+async def run_scenario(client: httpx.AsyncClient,
+                       target: str,
+                       fake_url: Optional[str],
+                       name: str,
+                       path: Callable[[], str],
+                       concurrency: int,
+                       duration: float,
+                       max_requests: Optional[int]) -> Dict[str, Any]:
+    """Keep `concurrency` requests in flight for `duration` seconds (or until `max_requests`)."""
+    latencies: List[float] = []
+    errors = 0
+    issued = 0
+    calls_before = await upstream_calls(client, fake_url)
+    started = time.perf_counter()
+    deadline = started + duration
+
+    async def worker():
+        nonlocal errors, issued
+        while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+            issued += 1
+            request_started = time.perf_counter()
+            try:
+                response = await client.get(target + path())
+                ok = response.status_code < 400 and (not response.headers.get("content-type", "").startswith("application/json")
+                                                     or response.json().get("success", True))
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - request_started)
+            errors += not ok
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    calls_after = await upstream_calls(client, fake_url)
+    latencies.sort()
+    requests = len(latencies)
+    return {
+        "scenario": name,
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "upstream_per_request": round((calls_after - calls_before) / requests, 3)
+        if requests and calls_before is not None else None
+    }
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    columns = ["scenario", "requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "upstream_per_request"]
+    widths = [max(len(column), *(len(str(result[column])) for result in results)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for result in results:
+        print("  ".join(str(result[column]).ljust(width) for column, width in zip(columns, widths)))
+
+
+def wait_until_up(url: str, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def spawn(args) -> List[subprocess.Popen]:
+    """Start the fake upstream and the app (under uvicorn) pointed at it, with a throwaway data directory."""
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "bench", "fake_perplexity.py"), "--port", str(args.fake_port),
+        "--latency-median", str(args.latency_median), "--error-rate", str(args.error_rate),
+        "--empty-rate", str(args.empty_rate)
+    ])
+    env = {
+        **os.environ,
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "bench"),
+        "PERPLEXITY_API_KEY": "bench",
+        "GOOGLE_MAPS_API_KEY": "bench",
+        "PERPLEXITY_BASE_URL": f"http://127.0.0.1:{args.fake_port}/chat/completions",
+        "CITYPULSE_DATA_DIR": tempfile.mkdtemp(prefix="citypulse-bench-")
+    }
+    app = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.app_port),
+                            "--log-level", "warning"], cwd=ROOT, env=env)
+    wait_until_up(f"http://127.0.0.1:{args.fake_port}/stats")
+    wait_until_up(f"http://127.0.0.1:{args.app_port}/")
+    return [fake, app]
+
+
+async def main_async(args) -> List[Dict[str, Any]]:
+    paths = scenario_paths(Locations(args.locations, args.seed))
+    names = list(paths) if args.scenario == "all" else args.scenario.split(",")
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = []
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+        for name in names:
+            results.append(await run_scenario(client, args.target, args.fake, name, paths[name],
+                                              args.concurrency, args.duration, args.requests))
+        if args.json:
+            stats = (await client.get(f"{args.target}/api/cache-stats")).json()
+            with open(args.json, "w") as f:
+                json.dump({"results": results, "cache_stats": stats}, f, indent=2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CityPulse load scenarios")
+    parser.add_argument("--target", default="http://127.0.0.1:5001", help="base URL of the app")
+    parser.add_argument("--fake", default=None, help="base URL of bench/fake_perplexity.py, for upstream call counts")
+    parser.add_argument("--scenario", default="all", help="all, or a comma-separated list of: landing, local-data, "
+                                                           "search-local, search-suggestions, location-insights")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20, help="seconds per scenario")
+    parser.add_argument("--requests", type=int, default=None, help="stop a scenario after this many requests")
+    parser.add_argument("--locations", type=int, default=50, help="size of the location pool")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="also write results and /api/cache-stats to this file")
+    parser.add_argument("--spawn", action="store_true", help="start the fake upstream and the app locally")
+    parser.add_argument("--app-port", type=int, default=5099)
+    parser.add_argument("--fake-port", type=int, default=8001)
+    parser.add_argument("--latency-median", type=float, default=1.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--empty-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    processes = []
+    if args.spawn:
+        processes = spawn(args)
+        args.target = f"http://127.0.0.1:{args.app_port}"
+        args.fake = f"http://127.0.0.1:{args.fake_port}"
+    try:
+        print_report(asyncio.run(main_async(args)))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# Record/replay of upstream HTTP traffic, for reproducing production load offline
+import json
+import gzip
+import codecs
+import time
+import zlib
+import asyncio
+import hashlib
+import threading
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+class CassetteMiss(Exception):
+    """Replay found no recorded response for a request."""
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def request_payload(body: Optional[bytes]) -> Any:
+    """The request body as JSON with whitespace collapsed in strings, or as text if it is not JSON."""
+    try:
+        return _normalize(json.loads(body or b"null"))
+    except ValueError:
+        return (body or b"").decode("utf-8", "replace")
+
+
+def request_key(method: str, payload: Any) -> str:
+    """Lookup key: a hash of the HTTP method plus the payload with sorted keys."""
+    payload = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(f"{method.upper()} {payload}".encode()).hexdigest()
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str):
+        """A gzipped JSON-lines log of exchanges, one per line:
+        {key, method, payload, status, content_type, chunks: [[offset, text]]}.
+
+        Each line keeps the normalized request it answered, so a cassette can be inspected and
+        diffed, and replay re-derives the key from it; the stored key is only a lookup aid.
+        Offsets are seconds since the request was sent, so replay can reproduce first-byte and
+        streaming timings. In replay mode, repeated requests with the same key get the recorded
+        responses in order, cycling once they run out.
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._cursors: Dict[str, int] = defaultdict(int)
+        self._file = None
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        if mode == "replay":
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        key = request_key(entry["method"], entry["payload"]) if "method" in entry else entry["key"]
+                        self._entries[key].append(entry)
+        else:
+            self._file = gzip.open(path, "at", encoding="utf-8")
+
+    def record(self, method: str, payload: Any, status: int, content_type: str, chunks: List[List[Any]]) -> None:
+        """Append one exchange; this blocks on the file, so async callers run it in a thread."""
+        entry = {"key": request_key(method, payload), "method": method.upper(), "payload": payload,
+                 "status": status, "content_type": content_type, "chunks": chunks}
+        with self._lock:
+            self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            # Sync-flush each entry so a crash loses at most the exchange in progress
+            self._file.flush()
+            self.recorded += 1
+
+    def next(self, method: str, payload: Any) -> Dict[str, Any]:
+        key = request_key(method, payload)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                raise CassetteMiss(f"No recorded response for request {key}")
+            entry = entries[self._cursors[key] % len(entries)]
+            self._cursors[key] += 1
+            self.replayed += 1
+            return entry
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "misses": self.misses,
+            "keys": len(self._entries)
+        }
+
+
+class _RecordingStream(httpx.AsyncByteStream):
+    def __init__(self, response: httpx.Response, cassette: Cassette, method: str, payload: Any, started: float):
+        self.response = response
+        self.cassette = cassette
+        self.method = method
+        self.payload = payload
+        self.started = started
+        self.chunks: List[List[Any]] = [[round(time.perf_counter() - started, 4), ""]]
+        gzipped = response.headers.get("content-encoding", "").lower() == "gzip"
+        self._gunzip = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+        # Chunks can split multi-byte characters
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.response.stream:
+            text = self._decoder.decode(self._gunzip.decompress(chunk) if self._gunzip else chunk)
+            if text:
+                self.chunks.append([round(time.perf_counter() - self.started, 4), text])
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self.response.stream.aclose()
+        # The gzip write and flush block, so keep them off the event loop
+        await asyncio.to_thread(self.cassette.record, self.method, self.payload, self.response.status_code,
+                                self.response.headers.get("content-type", ""), self.chunks)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport, cassette: Cassette):
+        """Pass requests through to `transport`, logging each response and its timings as it is read."""
+        self.transport = transport
+        self.cassette = cassette
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        payload = request_payload(await request.aread())
+        started = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_RecordingStream(response, self.cassette, request.method, payload, started),
+                              extensions=response.extensions)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+        self.cassette.close()
+
+
+class _ReplayStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: List[List[Any]], speed: float, started: float):
+        self.chunks = chunks
+        self.speed = speed
+        self.started = started
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for offset, text in self.chunks:
+            if self.speed > 0:
+                delay = self.started + offset / self.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if text:
+                yield text.encode()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cassette: Cassette, speed: float = 1.0):
+        """Serve recorded responses; `speed` 1 keeps recorded timings, 2 halves them, 0 skips waiting."""
+        self.cassette = cassette
+        self.speed = speed
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        entry = self.cassette.next(request.method, request_payload(await request.aread()))
+        chunks = entry["chunks"]
+        # The first chunk marks when headers arrived
+        if self.speed > 0 and chunks:
+            await asyncio.sleep(max(chunks[0][0] / self.speed - (time.perf_counter() - started), 0))
+        return httpx.Response(entry["status"], headers={"content-type": entry["content_type"]},
+                              stream=_ReplayStream(chunks, self.speed, started))
+
+
+class CassetteAdapter(HTTPAdapter):
+    def __init__(self, cassette: Cassette, speed: float = 1.0, **kwargs):
+        """requests adapter with the same record/replay behavior, for the synchronous client."""
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.speed = speed
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        body = request.body.encode() if isinstance(request.body, str) else request.body
+        payload = request_payload(body)
+        started = time.perf_counter()
+        if self.cassette.mode == "record":
+            response = super().send(request, **kwargs)
+            elapsed = round(time.perf_counter() - started, 4)
+            self.cassette.record(request.method, payload, response.status_code, response.headers.get("content-type", ""),
+                                 [[elapsed, response.text]])
+            return response
+
+        entry = self.cassette.next(request.method, payload)
+        if self.speed > 0 and entry["chunks"]:
+            time.sleep(entry["chunks"][-1][0] / self.speed)
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.headers = CaseInsensitiveDict({"content-type": entry["content_type"]})
+        response._content = "".join(text for _, text in entry["chunks"]).encode()
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
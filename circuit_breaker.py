@@ -0,0 +1,192 @@
+# Per-model circuit breakers that fail fast while the upstream is degraded
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import httpx
+
+from retry import FatalError
+from metrics import CIRCUIT_STATE, CIRCUIT_TRANSITIONS, CIRCUIT_REJECTED
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(FatalError):
+    """The breaker for a model is open; the call was not sent."""
+
+
+def is_failure(error: Optional[BaseException]) -> bool:
+    """Whether an outcome counts against upstream health: 5xx, 408, timeouts and connection errors."""
+    if error is None:
+        return False
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 408
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+
+class _Call:
+    def __init__(self, breaker: "CircuitBreaker"):
+        self.breaker = breaker
+
+    def __enter__(self) -> "_Call":
+        self.probe = self.breaker.allow()
+        self.started = time.monotonic()
+        return self
+
+    def sent(self) -> None:
+        """Restart the latency clock when the request actually goes out, after any client-side queueing."""
+        self.started = time.monotonic()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None and issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+            # Abandoned (e.g. a hedge that lost, or the caller's deadline); says nothing about the upstream
+            self.breaker.abandon(self.probe)
+        else:
+            self.breaker.record(is_failure(exc), time.monotonic() - self.started, self.probe)
+
+
+class CircuitBreaker:
+    def __init__(self,
+                 name: str,
+                 window: float = float(os.environ.get("BREAKER_WINDOW", 60)),
+                 min_calls: int = int(os.environ.get("BREAKER_MIN_CALLS", 10)),
+                 failure_rate: float = float(os.environ.get("BREAKER_FAILURE_RATE", 0.5)),
+                 slow_call: float = float(os.environ.get("BREAKER_SLOW_CALL", 30)),
+                 slow_rate: float = float(os.environ.get("BREAKER_SLOW_RATE", 0.8)),
+                 open_for: float = float(os.environ.get("BREAKER_OPEN_FOR", 20)),
+                 probes: int = int(os.environ.get("BREAKER_PROBES", 2))):
+        """Open when, over the last `window` seconds and at least `min_calls` calls, the share of failed calls
+        reaches `failure_rate` or the share slower than `slow_call` seconds reaches `slow_rate`.
+
+        After `open_for` seconds the breaker lets `probes` calls through (half-open); if they all
+        succeed it closes, and any failure opens it again.
+        """
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_for = open_for
+        self.probes = probes
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+        self._failures = 0
+        self._slow = 0
+        self._probes_started = 0
+        self._probes_passed = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+        CIRCUIT_STATE.inc(name, CLOSED)
+
+    def call(self) -> _Call:
+        """Context manager around one upstream call: raises CircuitOpenError if it may not be sent, else records its outcome."""
+        return _Call(self)
+
+    def _transition(self, state: str) -> None:
+        CIRCUIT_STATE.dec(self.name, self.state)
+        CIRCUIT_STATE.inc(self.name, state)
+        CIRCUIT_TRANSITIONS.inc(self.name, state)
+        print(f"Circuit breaker for {self.name}: {self.state} -> {state}")
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.opened += 1
+        elif state == HALF_OPEN:
+            self._probes_started = 0
+            self._probes_passed = 0
+        else:
+            self._calls.clear()
+            self._failures = 0
+            self._slow = 0
+
+    def allow(self) -> bool:
+        """Admit a call or raise CircuitOpenError; True means it is a half-open probe."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_for:
+                self._transition(HALF_OPEN)
+            if self.state == CLOSED:
+                return False
+            if self.state == HALF_OPEN and self._probes_started < self.probes:
+                self._probes_started += 1
+                return True
+            self.rejected += 1
+            CIRCUIT_REJECTED.inc(self.name)
+            raise CircuitOpenError(f"Circuit breaker for {self.name} is {self.state}")
+
+    def _prune(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window:
+            _, failed, slow = self._calls.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def record(self, failed: bool, elapsed: float, probe: bool = False) -> None:
+        slow = elapsed >= self.slow_call
+        with self._lock:
+            if probe:
+                if self.state != HALF_OPEN:
+                    return
+                if failed or slow:
+                    self._transition(OPEN)
+                else:
+                    self._probes_passed += 1
+                    if self._probes_passed >= self.probes:
+                        self._transition(CLOSED)
+                return
+            if self.state != CLOSED:
+                return
+            now = time.monotonic()
+            self._calls.append((now, failed, slow))
+            self._failures += failed
+            self._slow += slow
+            self._prune(now)
+            calls = len(self._calls)
+            if calls >= self.min_calls and (self._failures >= self.failure_rate * calls
+                                            or self._slow >= self.slow_rate * calls):
+                self._transition(OPEN)
+
+    def abandon(self, probe: bool) -> None:
+        """Give back a probe slot when the call was cancelled before it produced an outcome."""
+        if probe:
+            with self._lock:
+                if self.state == HALF_OPEN:
+                    self._probes_started -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._prune(time.monotonic())
+            return {
+                "state": self.state,
+                "calls": len(self._calls),
+                "failures": self._failures,
+                "slow": self._slow,
+                "opened": self.opened,
+                "rejected": self.rejected
+            }
+
+
+class CircuitBreakers:
+    def __init__(self, **settings):
+        """One CircuitBreaker per model, created on first use with the same settings."""
+        self.settings = settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(model)
+                if breaker is None:
+                    breaker = self._breakers[model] = CircuitBreaker(model, **self.settings)
+        return breaker
+
+    def stats(self) -> Dict[str, Any]:
+        return {model: breaker.stats() for model, breaker in list(self._breakers.items())}
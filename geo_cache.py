@@ -0,0 +1,126 @@
+# Geocell-keyed response cache
+import os
+import json
+import math
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_PRECISION = int(os.environ.get("GEO_CACHE_PRECISION", 3))
+
+
+def geocell(lat: float, lng: float, precision: int = DEFAULT_PRECISION) -> str:
+    """Quantize coordinates onto a fixed lat/lng grid (precision 3 is roughly a 110m cell)."""
+    scale = 10 ** precision
+    return f"{precision}:{math.floor(lat * scale)}:{math.floor(lng * scale)}"
+
+
+def normalize_query(query: Optional[str]) -> str:
+    """Lowercase and collapse whitespace so trivially different queries share a key."""
+    return " ".join((query or "").lower().split())
+
+
+class GeoCache:
+    def __init__(self,
+                 ttl: float = 600,
+                 max_entries: int = 1024,
+                 max_bytes: int = 32 * 1024 * 1024,
+                 precision: int = DEFAULT_PRECISION,
+                 max_age: Optional[float] = None):
+        """Initialize a TTL + LRU cache bounded by entry count and approximate memory.
+
+        Entries are fresh for `ttl` seconds but kept until `max_age` (default `ttl`), so `lookup`
+        can serve them stale while they are refreshed.
+        """
+        self.ttl = ttl
+        self.max_age = max(ttl, max_age or 0)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.precision = precision
+        self._entries: "OrderedDict[Tuple, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+
+    def key(self, namespace: str, lat: float, lng: float, query: str = "") -> Tuple[str, str, str]:
+        """Build a cache key from an endpoint namespace, the coordinate cell and the query."""
+        return (namespace, geocell(lat, lng, self.precision), normalize_query(query))
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        """Return the cached value for key, or None if missing or expired."""
+        found = self.lookup(key)
+        return None if found is None else found[0]
+
+    def lookup(self, key: Tuple, allow_stale: bool = False) -> Optional[Tuple[Any, float]]:
+        """Return (value, age in seconds) for key; past `ttl` only if `allow_stale`, and never past `max_age`."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, size, value = entry
+            age = now - stored_at
+            if age > self.max_age:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if age > self.ttl:
+                if not allow_stale:
+                    self.misses += 1
+                    return None
+                self.stale_hits += 1
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value, age
+
+    def set(self, key: Tuple, value: Any) -> None:
+        """Store value under key, evicting least recently used entries to stay within bounds."""
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every entry, keeping the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "stale_hits": self.stale_hits,
+                "ttl": self.ttl,
+                "max_age": self.max_age,
+                "precision": self.precision
+            }
+
+    def _remove(self, key: Tuple) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
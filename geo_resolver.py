@@ -0,0 +1,178 @@
+# Server-side coordinate resolution for POIs the model returned without coordinates
+import json
+import time
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from geo_cache import geocell
+from poi_index import poi_position
+from storage import data_path, connect_sqlite
+
+PLACEHOLDER_ADDRESSES = {"", "address not specified", "location tbd", "address tbd", "n/a", "unknown"}
+
+RESOLVE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "locations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "index": {"type": "integer"},
+                    "latitude": {"type": "number"},
+                    "longitude": {"type": "number"}
+                },
+                "required": ["index", "latitude", "longitude"]
+            }
+        }
+    },
+    "required": ["locations"]
+}
+
+
+def lookup_text(item: Dict[str, Any]) -> str:
+    """The text used to geocode an item: its address, or its venue name when there is no usable address.
+
+    Alerts are titled rather than named ("Road work"), so a title alone is never looked up.
+    """
+    address = " ".join(str(item.get("address") or "").split())
+    if address.lower() in PLACEHOLDER_ADDRESSES:
+        address = ""
+    return address or " ".join(str(item.get("name") or "").split())
+
+
+class AddressCache:
+    def __init__(self, path: Optional[str] = None, ttl: float = 90 * 24 * 3600, miss_ttl: float = 24 * 3600):
+        """Persistent address -> coordinate cache in SQLite; failed lookups are remembered for `miss_ttl`."""
+        self.path = path or data_path("addresses.db")
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(self.path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS addresses ("
+            "key TEXT PRIMARY KEY, latitude REAL, longitude REAL, resolved_at REAL NOT NULL)"
+        )
+
+    def get_many(self, keys: List[str]) -> Dict[str, Optional[Tuple[float, float]]]:
+        """Return {key: (lat, lng) or None for a remembered miss}; unknown or expired keys are omitted."""
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        with self._lock:
+            placeholders = ",".join("?" * len(keys))
+            rows = self._conn.execute(
+                f"SELECT key, latitude, longitude, resolved_at FROM addresses WHERE key IN ({placeholders})", keys
+            ).fetchall()
+        for key, lat, lng, resolved_at in rows:
+            if lat is None:
+                if now - resolved_at <= self.miss_ttl:
+                    found[key] = None
+            elif now - resolved_at <= self.ttl:
+                found[key] = (lat, lng)
+        return found
+
+    def put_many(self, entries: Dict[str, Optional[Tuple[float, float]]]) -> None:
+        now = time.time()
+        rows = [(key, *(position or (None, None)), now) for key, position in entries.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO addresses (key, latitude, longitude, resolved_at) VALUES (?, ?, ?, ?)", rows
+            )
+
+
+class LocationResolver:
+    def __init__(self, cache: AddressCache, max_batch: int = 30, timeout: float = 10):
+        """Fill missing coordinates from the cache, resolving new addresses with one batched upstream call."""
+        self.cache = cache
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.items = 0
+        self.had_coordinates = 0
+        self.filled_from_cache = 0
+        self.filled_from_upstream = 0
+        self.batches = 0
+
+    async def resolve(self, api, content: Dict[str, Any], lat: float, lng: float) -> Dict[str, Any]:
+        """Return content with coordinates filled in where they could be resolved."""
+        # Addresses are only unique within an area, so keys carry a coarse (~11km) cell
+        area = geocell(lat, lng, 1)
+        pending: Dict[str, List[Dict[str, Any]]] = {}
+        texts: Dict[str, str] = {}
+        for items in content.values():
+            if not isinstance(items, list):
+                continue
+            for item in items:
+                if not isinstance(item, dict):
+                    continue
+                self.items += 1
+                if poi_position(item) is not None:
+                    self.had_coordinates += 1
+                    continue
+                text = lookup_text(item)
+                if text:
+                    key = f"{area}|{text.lower()}"
+                    pending.setdefault(key, []).append(item)
+                    texts[key] = text
+        if not pending:
+            return content
+
+        # The address cache is SQLite, so its queries run off the event loop
+        positions = await asyncio.to_thread(self.cache.get_many, list(pending))
+        self.filled_from_cache += sum(len(pending[key]) for key, position in positions.items() if position)
+        unknown = [key for key in pending if key not in positions][:self.max_batch]
+        if unknown:
+            try:
+                resolved = await asyncio.wait_for(self._resolve_batch(api, [texts[key] for key in unknown], lat, lng),
+                                                  timeout=self.timeout)
+            except Exception as e:
+                print(f"Location resolution failed: {e!r}")
+            else:
+                learned = {key: resolved.get(index) for index, key in enumerate(unknown)}
+                await asyncio.to_thread(self.cache.put_many, learned)
+                self.filled_from_upstream += sum(len(pending[key]) for key, position in learned.items() if position)
+                positions.update(learned)
+
+        filled = {}
+        for category, items in content.items():
+            if not isinstance(items, list):
+                filled[category] = items
+                continue
+            filled[category] = []
+            for item in items:
+                key = f"{area}|{lookup_text(item).lower()}" if isinstance(item, dict) else None
+                position = positions.get(key) if key in pending else None
+                if position:
+                    item = {**item, "latitude": position[0], "longitude": position[1], "coordinates_source": "resolved"}
+                filled[category].append(item)
+        return filled
+
+    async def _resolve_batch(self, api, texts: List[str], lat: float, lng: float) -> Dict[int, Tuple[float, float]]:
+        self.batches += 1
+        listing = "\n".join(f"{index}. {text}" for index, text in enumerate(texts))
+        prompt = (
+            f"Give the latitude and longitude of each of these places near coordinates {lat}, {lng}. "
+            f"Return one entry per place using its number as index; skip places you cannot locate.\n\n{listing}"
+        )
+        content = await api.structured_output(prompt=prompt, schema=RESOLVE_SCHEMA)
+        if isinstance(content, str):
+            content = json.loads(content)
+        resolved = {}
+        for entry in content.get("locations", []):
+            position = poi_position(entry)
+            if position and isinstance(entry.get("index"), int) and 0 <= entry["index"] < len(texts):
+                resolved[entry["index"]] = position
+        return resolved
+
+    def stats(self) -> Dict[str, Any]:
+        filled = self.filled_from_cache + self.filled_from_upstream
+        return {
+            "items": self.items,
+            "had_coordinates": self.had_coordinates,
+            "filled_from_cache": self.filled_from_cache,
+            "filled_from_upstream": self.filled_from_upstream,
+            "batches": self.batches,
+            "fill_rate": round((self.had_coordinates + filled) / self.items, 4) if self.items else 0.0
+        }
@@ -0,0 +1,107 @@
+# Hedged requests for tail-latency reduction
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class Hedger:
+    def __init__(self,
+                 percentile: float = float(os.environ.get("PERPLEXITY_HEDGE_PERCENTILE", 0.95)),
+                 max_hedge_ratio: float = float(os.environ.get("PERPLEXITY_HEDGE_MAX_RATIO", 0.1)),
+                 initial_delay: float = float(os.environ.get("PERPLEXITY_HEDGE_INITIAL_DELAY", 10)),
+                 min_delay: float = 0.5,
+                 window: int = 500,
+                 min_samples: int = 20):
+        """Fire a second identical call when the first is slower than the observed latency percentile.
+
+        Until `min_samples` latencies have been observed the hedge fires after `initial_delay` seconds.
+        At most `max_hedge_ratio` of calls are hedged.
+        """
+        self.percentile = percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.hedges_skipped = 0
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait on the primary call before hedging."""
+        if len(self._latencies) < self.min_samples:
+            return self.initial_delay
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+    def _can_hedge(self) -> bool:
+        return self.hedges_fired < self.max_hedge_ratio * self.requests
+
+    def _start(self, fn: Callable[[], Awaitable[Any]], release: Optional[Callable[[], None]] = None) -> asyncio.Task:
+        started = time.monotonic()
+        task = asyncio.ensure_future(fn())
+
+        def record(t: asyncio.Task) -> None:
+            if release is not None:
+                release()
+            if not t.cancelled() and t.exception() is None:
+                self._latencies.append(time.monotonic() - started)
+
+        task.add_done_callback(record)
+        return task
+
+    async def run(self,
+                  fn: Callable[[], Awaitable[Any]],
+                  hedge_slot: Optional[Callable[[], Optional[Callable[[], None]]]] = None) -> Any:
+        """Call fn, hedging it with a second identical call if it is slow; the first success wins.
+
+        The caller should start this once the primary call is admitted upstream, so queueing is
+        neither timed nor hedged. `hedge_slot` claims capacity for the hedge without waiting and
+        returns the function that gives it back, or None to skip the hedge.
+        """
+        self.requests += 1
+        primary = self._start(fn)
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_delay())
+            if done or not self._can_hedge():
+                return await primary
+
+            release = None
+            if hedge_slot is not None:
+                release = hedge_slot()
+                if release is None:
+                    # No spare upstream capacity; a queued hedge would only add to the backlog
+                    self.hedges_skipped += 1
+                    return await primary
+            self.hedges_fired += 1
+            hedge = self._start(fn, release)
+            pending.add(hedge)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedges_won += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            # Cancel the loser (or both, if our caller was cancelled)
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "hedges_skipped": self.hedges_skipped,
+            "hedge_delay": round(self.hedge_delay(), 3),
+            "max_hedge_ratio": self.max_hedge_ratio
+        }
@@ -0,0 +1,95 @@
+# Disk-backed memo of location insights keyed on a venue fingerprint
+import time
+import hashlib
+import threading
+from typing import Dict, Optional, Tuple
+
+from storage import data_path, connect_sqlite
+from geo_resolver import PLACEHOLDER_ADDRESSES
+from poi_dedup import PUNCTUATION
+
+
+def _normalize(text: str) -> str:
+    return " ".join(PUNCTUATION.sub(" ", (text or "").lower()).split())
+
+
+_PLACEHOLDERS = {_normalize(address) for address in PLACEHOLDER_ADDRESSES}
+
+
+def venue_fingerprint(name: str, location_type: str, address: str) -> str:
+    """Stable key for a venue: normalized name, type and address, with placeholder addresses treated as empty."""
+    address = _normalize(address)
+    if address in _PLACEHOLDERS:
+        address = ""
+    key = "|".join((_normalize(name), _normalize(location_type), address))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+class InsightsCache:
+    def __init__(self,
+                 path: Optional[str] = None,
+                 ttl: float = 24 * 3600,
+                 max_stale: float = 7 * 24 * 3600,
+                 max_entries: int = 5000):
+        """Entries are fresh for `ttl` seconds and may be served stale while refreshing until `max_stale`."""
+        self.path = path or data_path("insights.db")
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(self.path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS insights ("
+            "key TEXT PRIMARY KEY, insights TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS insights_accessed_at ON insights (accessed_at)")
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Tuple[str, bool]]:
+        """Return (insights, stale) or None if missing or past max_stale."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT insights, created_at FROM insights WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.max_stale:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE insights SET accessed_at = ? WHERE key = ?", (now, key))
+        stale = now - row[1] > self.ttl
+        if stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return row[0], stale
+
+    def is_fresh(self, key: str) -> bool:
+        """Whether a fresh entry exists, without counting a lookup or touching its recency."""
+        with self._lock:
+            row = self._conn.execute("SELECT created_at FROM insights WHERE key = ?", (key,)).fetchone()
+        return row is not None and time.time() - row[0] <= self.ttl
+
+    def put(self, key: str, insights: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO insights (key, insights, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, insights, now, now)
+            )
+            # Least recently read entries go first once the table is over its bound
+            self._conn.execute(
+                "DELETE FROM insights WHERE key IN "
+                "(SELECT key FROM insights ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM insights").fetchone()[0]
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses
+        }
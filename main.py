@@ -4,9 +4,28 @@ import os
 from dotenv import load_dotenv
 
 from datetime import datetime
+import asyncio
+import json
 import uuid
 
-from perplexity_client import PerplexityAPI
+from perplexity_client import get_shared_async_client, get_cassette, get_rate_limiter
+from geo_cache import GeoCache, normalize_query, geocell
+from singleflight import SingleFlight
+from retry import RetryPolicy, RetryBudget, EmptyResultError, retry_call
+from stream_json import PoiStreamParser
+from shared_store import create_store
+from poi_index import PoiIndex, poi_position
+from poi_dedup import dedupe_pois
+from geo_resolver import AddressCache, LocationResolver
+from suggest_index import SuggestIndex
+from storage import data_path
+from page_cache import RenderedPage, slot
+from static_assets import StaticAssets
+from insights_cache import InsightsCache, venue_fingerprint
+from prefetch import Prefetcher, insight_requests
+from metrics import REGISTRY, MetricsMiddleware
+from rate_limit import INTERACTIVE, STANDARD, BACKGROUND, in_lane, upstream_lane
+from tiles import tile_center, tile_count, tiles_in_bbox, in_bbox
 
 # Load environment variables
 load_dotenv()
@@ -16,17 +35,82 @@ secret_key = os.environ.get('SECRET_KEY')
 if not secret_key:
     raise ValueError("SECRET_KEY environment variable must be set")
 
+def save_suggestions():
+    SUGGEST_INDEX.save(SUGGEST_SNAPSHOT)
+
 # Create the FastHTML app
 app, rt = fast_app(
     pico=False,
     secret_key=secret_key,
+    on_shutdown=[save_suggestions],
+    middleware=[Middleware(MetricsMiddleware)],
     hdrs=(
         Link(rel="icon", href="/static/favicon.ico", type="image/x-icon"),
     )
 )
 
-# In-memory storage for shared locations
-SHARED_LOCATIONS = {}
+# Persistent storage for shared locations (SQLite by default, see shared_store.py)
+SHARED_LOCATIONS = create_store()
+
+# Response cache for searches, keyed on coordinate cell + query (local data is cached per category, see LOCAL_DATA_CACHES)
+LOCAL_DATA_CACHE = GeoCache(
+    ttl=float(os.environ.get("GEO_CACHE_TTL", 600)),
+    max_entries=int(os.environ.get("GEO_CACHE_MAX_ENTRIES", 1024)),
+    max_bytes=int(os.environ.get("GEO_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+)
+
+# Identical concurrent upstream requests (same endpoint, cell and query) share one call
+UPSTREAM_FLIGHTS = SingleFlight()
+
+# Retries for structured upstream calls are bounded by a deadline and a traffic-wide budget
+UPSTREAM_RETRY_POLICY = RetryPolicy()
+UPSTREAM_RETRY_BUDGET = RetryBudget()
+
+# Recently returned POIs, so pans in the same neighborhood can skip the upstream call
+POI_INDEX = PoiIndex()
+POI_INDEX_RADIUS = float(os.environ.get("POI_INDEX_RADIUS", 1500))
+POI_INDEX_MAX_AGE = float(os.environ.get("POI_INDEX_MAX_AGE", 900))
+# Minimum fresh items per category to answer /api/local-data from the index alone (0 disables)
+POI_INDEX_MIN_ITEMS = int(os.environ.get("POI_INDEX_MIN_ITEMS", 3))
+
+# Fills coordinates the model left out, from a persistent address cache or one batched follow-up call
+LOCATION_RESOLVER = LocationResolver(AddressCache(os.environ.get("ADDRESS_CACHE_DB")))
+RESOLVE_LOCATIONS = os.environ.get("RESOLVE_LOCATIONS", "1") == "1"
+
+# Autocomplete answers from past queries per area; the upstream only backfills cold prefixes
+SUGGEST_INDEX = SuggestIndex(min_results=int(os.environ.get("SUGGEST_MIN_RESULTS", 3)))
+SUGGEST_SNAPSHOT = os.environ.get("SUGGEST_SNAPSHOT") or data_path("suggestions.json.gz")
+SUGGEST_SNAPSHOT_INTERVAL = float(os.environ.get("SUGGEST_SNAPSHOT_INTERVAL", 60))
+print(f"Loaded {SUGGEST_INDEX.load(SUGGEST_SNAPSHOT)} search suggestions from {SUGGEST_SNAPSHOT}")
+
+# Location insights are memoized on disk per venue and refreshed in the background once stale
+INSIGHTS_CACHE = InsightsCache(
+    os.environ.get("INSIGHTS_CACHE_DB"),
+    ttl=float(os.environ.get("INSIGHTS_CACHE_TTL", 24 * 3600)),
+    max_stale=float(os.environ.get("INSIGHTS_CACHE_MAX_STALE", 7 * 24 * 3600)),
+    max_entries=int(os.environ.get("INSIGHTS_CACHE_MAX_ENTRIES", 5000))
+)
+
+# Opt-in: generate insights for the top pins of each response while the server is otherwise idle
+PREFETCH_INSIGHTS = os.environ.get("PREFETCH_INSIGHTS", "0") == "1"
+PREFETCH_TOP_N = int(os.environ.get("PREFETCH_TOP_N", 5))
+INSIGHTS_PREFETCHER = Prefetcher(
+    lambda job: prefetch_insights(job),
+    # Only prefetch when no foreground upstream call (interactive or standard lane) is running or queued
+    foreground_busy=lambda: get_rate_limiter().pending((INTERACTIVE, STANDARD)) > 0,
+    workers=int(os.environ.get("PREFETCH_WORKERS", 2))
+)
+
+# Background refresh tasks, referenced until they finish
+BACKGROUND_REFRESHES = set()
+
+# Fetch each local-data category with its own concurrent call instead of one combined prompt
+LOCAL_DATA_FANOUT = os.environ.get("LOCAL_DATA_FANOUT", "0") == "1"
+
+# Viewport queries are split into fixed slippy-map tiles, each cached like a single-point query at its center
+TILE_ZOOM = int(os.environ.get("TILE_ZOOM", 15))
+TILE_MAX_TILES = int(os.environ.get("TILE_MAX_TILES", 25))
+TILE_FETCH_CONCURRENCY = int(os.environ.get("TILE_FETCH_CONCURRENCY", 4))
 
 LOCAL_INFO_SCHEMA = {
     "type": "object",
@@ -115,15 +199,240 @@ LOCAL_INFO_SCHEMA = {
     "required": ["events", "restaurants", "alerts"]
 }
 
+LOCAL_INFO_CATEGORIES = ("events", "restaurants", "alerts")
+
+# Local data is cached per category, since alerts go stale in minutes and restaurants in days. Past its
+# TTL a category is served stale while it refreshes in the background, up to its max age.
+CATEGORY_CACHE_DEFAULTS = {"events": (1800, 6 * 3600), "restaurants": (6 * 3600, 3 * 86400), "alerts": (300, 1800)}
+LOCAL_DATA_CACHES = {
+    category: GeoCache(
+        ttl=float(os.environ.get(f"{category.upper()}_CACHE_TTL", ttl)),
+        max_entries=int(os.environ.get("GEO_CACHE_MAX_ENTRIES", 1024)),
+        max_bytes=int(os.environ.get("GEO_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+        max_age=float(os.environ.get(f"{category.upper()}_CACHE_MAX_AGE", max_age))
+    )
+    for category, (ttl, max_age) in CATEGORY_CACHE_DEFAULTS.items()
+}
+
+def category_schema(category: str) -> dict:
+    """Derive a single-category schema from LOCAL_INFO_SCHEMA."""
+    return {
+        "type": "object",
+        "properties": {category: LOCAL_INFO_SCHEMA["properties"][category]},
+        "required": [category]
+    }
+
+def local_data_prompt(lat: float, lng: float) -> str:
+    return f"Find current information near coordinates {lat}, {lng}"
+
+def search_prompt(lat: float, lng: float, query: str) -> str:
+    # Create a custom prompt based on user query
+    return f"""Find information about "{query}" near coordinates {lat}, {lng}. 
+    
+    Based on the query, categorize results appropriately:
+    - If it's about events/entertainment/activities, put in events array
+    - If it's about food/dining/restaurants, put in restaurants array  
+    - If it's about alerts/traffic/weather/safety, put in alerts array
+    
+    Include relevant results for the user's specific request: "{query}"
+    """
+
+def has_local_data(content: dict, categories: tuple = LOCAL_INFO_CATEGORIES) -> bool:
+    return any(len(content.get(category, [])) > 0 for category in categories)
+
+async def fetch_structured_local_info(prompt: str,
+                                      label: str = "Attempt",
+                                      schema: dict = LOCAL_INFO_SCHEMA,
+                                      categories: tuple = LOCAL_INFO_CATEGORIES):
+    """Query structured local data, retrying failures and empty results. Returns (result, attempts)."""
+    api = get_shared_async_client()
+    
+    async def attempt():
+        result = await api.geo_structured_output_with_citations(
+            prompt=prompt,
+            schema=schema
+        )
+        
+        content = result["content"]
+        if isinstance(content, str):
+            content = json.loads(content)
+        
+        result = {"content": content, "citations": result.get("citations", [])}
+        # Empty arrays are retried; if retries run out the empty result is returned as-is
+        if not has_local_data(content, categories):
+            raise EmptyResultError(result)
+        return result
+    
+    return await retry_call(attempt, UPSTREAM_RETRY_POLICY, UPSTREAM_RETRY_BUDGET, label=label)
+
+async def fetch_local_info_fanout(prompt: str, label: str = "Attempt", categories: tuple = LOCAL_INFO_CATEGORIES):
+    """Fetch each category concurrently with its own schema and retries, then merge them.
+
+    Categories that gave up are listed under "failed" in the result.
+    """
+    outcomes = await asyncio.gather(*(
+        fetch_structured_local_info(
+            f"{prompt}\n\nOnly return {category}.",
+            label=f"{label} ({category})",
+            schema=category_schema(category),
+            categories=(category,)
+        )
+        for category in categories
+    ), return_exceptions=True)
+    
+    failures = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+    if len(failures) == len(outcomes):
+        raise failures[0]
+    
+    content = {category: [] for category in categories}
+    citations = []
+    failed = []
+    attempts = 0
+    for category, outcome in zip(categories, outcomes):
+        if isinstance(outcome, BaseException):
+            print(f"{label} ({category}) gave up: {outcome!r}")
+            failed.append(category)
+            continue
+        result, category_attempts = outcome
+        content[category] = result["content"].get(category, [])
+        citations.extend(c for c in result["citations"] if c not in citations)
+        attempts = max(attempts, category_attempts)
+    
+    return {"content": content, "citations": citations, "failed": failed}, attempts
+
+async def resolve_locations(content: dict, lat: float, lng: float) -> dict:
+    """Fill missing POI coordinates server-side so pins are not placed at random around the user."""
+    if not RESOLVE_LOCATIONS:
+        return content
+    return await LOCATION_RESOLVER.resolve(get_shared_async_client(), content, lat, lng)
+
+def background_flight(key: tuple) -> tuple:
+    """Flight key for BACKGROUND-lane work, kept apart from the foreground key so a user's request never joins it."""
+    return ("background",) + key
+
+def refresh_in_background(key: tuple, fn) -> None:
+    """Run fn through the single-flight group without waiting for it, so repeated refreshes of a key share one call."""
+    task = asyncio.ensure_future(UPSTREAM_FLIGHTS.do(background_flight(key), in_lane(BACKGROUND, fn)))
+    BACKGROUND_REFRESHES.add(task)
+    task.add_done_callback(BACKGROUND_REFRESHES.discard)
+
+def prefetch_session(session) -> str:
+    """Id grouping a browser's prefetch jobs (None when prefetch is off); set before responding so the cookie carries it."""
+    if not PREFETCH_INSIGHTS:
+        return None
+    return session.setdefault("sid", str(uuid.uuid4()))
+
+def schedule_prefetch(session_id: str, lat: float, lng: float, response: dict) -> None:
+    """Queue insight prefetches for a response's top pins; moving to another ~1km cell drops the session's older jobs."""
+    if session_id is None or not response.get("success"):
+        return
+    INSIGHTS_PREFETCHER.submit(session_id, geocell(lat, lng, 2), insight_requests(response.get("data", {}), PREFETCH_TOP_N))
+
+def remember_local_data(cache_key: tuple, response: dict) -> None:
+    """Cache a successful search response and index its POIs for nearby lookups."""
+    LOCAL_DATA_CACHE.set(cache_key, response)
+    POI_INDEX.add(response["data"])
+
+def cached_response(cache_key: tuple):
+    """Fresh cached search response marked with its age, or None."""
+    found = LOCAL_DATA_CACHE.lookup(cache_key)
+    if found is None:
+        return None
+    response, age = found
+    return {**response, "cached": True, "age": round(age)}
+
+def local_data_key(lat: float, lng: float, category: str) -> tuple:
+    return LOCAL_DATA_CACHES[category].key("local-data", lat, lng, category)
+
+def local_data_flight(lat: float, lng: float, categories: tuple) -> tuple:
+    """Single-flight key for fetching some categories of a cell."""
+    return ("local-data", geocell(lat, lng, LOCAL_DATA_CACHE.precision), categories)
+
+def remember_categories(lat: float, lng: float, response: dict, categories: tuple) -> None:
+    """Cache each fetched category of a local-data response on its own and index its POIs."""
+    for category in categories:
+        LOCAL_DATA_CACHES[category].set(local_data_key(lat, lng, category),
+                                        {"items": response["data"].get(category, []), "citations": response["citations"]})
+    POI_INDEX.add(response["data"])
+
+def lookup_local_data(lat: float, lng: float):
+    """Look a cell up in every category cache: ({category: (entry, age)}, stale categories, missing categories)."""
+    entries, stale, missing = {}, [], []
+    for category in LOCAL_INFO_CATEGORIES:
+        cache = LOCAL_DATA_CACHES[category]
+        found = cache.lookup(local_data_key(lat, lng, category), allow_stale=True)
+        if found is None:
+            missing.append(category)
+            continue
+        entries[category] = found
+        if found[1] > cache.ttl:
+            stale.append(category)
+    return entries, tuple(stale), tuple(missing)
+
+def merge_cached_categories(response: dict, entries: dict) -> dict:
+    """Add cached categories to a response: data from the response wins, citations are combined."""
+    data = {category: entry["items"] for category, (entry, _) in entries.items()}
+    citations = list(response.get("citations", []))
+    for entry, _ in entries.values():
+        citations.extend(c for c in entry["citations"] if c not in citations)
+    return {**response, "data": dedupe_pois({**data, **response.get("data", {})}), "citations": citations}
+
+def cached_local_data(lat: float, lng: float, entries: dict, stale: tuple) -> dict:
+    """Answer from the category caches, refreshing each stale category in the background on its own."""
+    for category in stale:
+        refresh_in_background(local_data_flight(lat, lng, (category,)),
+                              lambda category=category: fetch_local_data(lat, lng, (category,)))
+    response = merge_cached_categories({"success": True, "cached": True}, entries)
+    response["age"] = round(max(age for _, age in entries.values()))
+    if stale:
+        response["stale"] = True
+        response["stale_categories"] = list(stale)
+    return response
+
+def blend_with_index(response: dict, indexed: dict) -> dict:
+    """Fill empty categories from the POI index, or answer from it entirely if the upstream failed."""
+    if not response.get("success"):
+        if has_local_data(indexed):
+            return {"success": True, "data": dedupe_pois(indexed), "citations": [], "source": "index", "error": response.get("error")}
+        return response
+    
+    data = response["data"]
+    blended = [category for category in LOCAL_INFO_CATEGORIES if not data.get(category) and indexed.get(category)]
+    if not blended:
+        return response
+    data = dedupe_pois({**data, **{category: indexed[category] for category in blended}})
+    return {**response, "data": data, "blended": blended}
+
+def index_answer(lat: float, lng: float):
+    """Recently indexed POIs near a point, and a response built from them alone if every category has enough (else None)."""
+    indexed = POI_INDEX.nearby(lat, lng, POI_INDEX_RADIUS, LOCAL_INFO_CATEGORIES, POI_INDEX_MAX_AGE)
+    if POI_INDEX_MIN_ITEMS and all(len(indexed[category]) >= POI_INDEX_MIN_ITEMS for category in LOCAL_INFO_CATEGORIES):
+        return indexed, {"success": True, "data": dedupe_pois(indexed), "citations": [], "source": "index"}
+    return indexed, None
+
+def degrade_to_index(response: dict, indexed: dict, lat: float, lng: float) -> dict:
+    """Blend a local-data response with the index; if the upstream is failing (or its breaker open), pins of any age beat an error."""
+    if not response.get("success") and not has_local_data(indexed):
+        indexed = POI_INDEX.nearby(lat, lng, POI_INDEX_RADIUS, LOCAL_INFO_CATEGORIES)
+    return blend_with_index(response, indexed)
+
+# Fingerprinted, precompressed copies of everything under static/, loaded once at startup
+STATIC_ASSETS = StaticAssets("static")
+
+@app.get("/static/{fname:path}")
+def static_asset(req, fname: str):
+    return STATIC_ASSETS.response(req, fname) or Response('404 Not Found', status_code=404)
+
+# fast_app registers its own catch-all static route when the app is created; match ours first
+app.router.routes.sort(key=lambda route: getattr(route, "path", "") != "/static/{fname:path}")
+
 # For images, CSS, etc.
 @app.get("/{fname:path}.{ext:static}")
 def static(fname: str, ext: str):
     return FileResponse(f'{fname}.{ext}')
 
-@rt("/")
-def get():
-    api_key = os.getenv("GOOGLE_MAPS_API_KEY")
-    
+def landing_page(api_key: str):
+    """Landing page tree; it only depends on the Maps API key, so it is rendered once at startup."""
     return Titled("🏙️ CityPulse - AI-powered Geospatial Search",
         Div(
             Div(
@@ -332,12 +641,15 @@ def get():
         Script(src=f"https://maps.googleapis.com/maps/api/js?key={api_key}&callback=initMap&loading=async&libraries=marker")
     )
 
+LANDING_PAGE = RenderedPage(app, landing_page(os.getenv("GOOGLE_MAPS_API_KEY")), rewrite=STATIC_ASSETS.rewrite_html)
 
-@rt("/shared/{location_id}")
-def shared_location(location_id: str):
-    # This will display a shared location
-    api_key = os.getenv("GOOGLE_MAPS_API_KEY")
-    
+@rt("/")
+def get(req):
+    return LANDING_PAGE.response(req)
+
+
+def shared_page(api_key: str):
+    """Shared location page tree; the location id is filled into its slot per request."""
     return Titled("🏙️ CityPulse - Shared Location to Explore",
         Div(
             Div(
@@ -375,103 +687,165 @@ def shared_location(location_id: str):
         # Include Bootstrap CSS and JS
         Link(rel="stylesheet", href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css"),
         Script(src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"),
-        Script(f"window.sharedLocationId = '{location_id}';"),
+        Script(f"window.sharedLocationId = {slot('location_id')};"),
         Script(src="/static/app.js"),
         Script(src=f"https://maps.googleapis.com/maps/api/js?key={api_key}&callback=initSharedMap&loading=async&libraries=marker")
     )
 
+SHARED_PAGE = RenderedPage(app, shared_page(os.getenv("GOOGLE_MAPS_API_KEY")), script_slots=["location_id"],
+                           rewrite=STATIC_ASSETS.rewrite_html)
+
+@rt("/shared/{location_id}")
+def shared_location(req, location_id: str):
+    # This will display a shared location
+    return SHARED_PAGE.response(req, location_id=location_id)
+
 @rt("/api/local-data")
-def get_local_data(lat: float, lng: float):
-    api = PerplexityAPI()
+async def get_local_data(lat: float, lng: float, session):
+    session_id = prefetch_session(session)
+    response = await load_local_data(lat, lng)
+    schedule_prefetch(session_id, lat, lng, response)
+    return response
+
+async def load_local_data(lat: float, lng: float, found: tuple = None):
+    """Answer a local-data request from the caches, the POI index or the upstream; `found` is a lookup_local_data result already in hand."""
+    entries, stale, missing = found or lookup_local_data(lat, lng)
+    if not missing:
+        return cached_local_data(lat, lng, entries, stale)
     
-    prompt = f"Find current information near coordinates {lat}, {lng}"
+    indexed, response = index_answer(lat, lng)
+    if response is not None:
+        return response
     
-    max_retries = 10
-    for attempt in range(max_retries):
-        try:
-            result = api.geo_structured_output_with_citations(
-                prompt=prompt,
-                schema=LOCAL_INFO_SCHEMA
-            )
-            
-            import json
-            content = result["content"]
-            if isinstance(content, str):
-                content = json.loads(content)
-            
-            # Check if we got meaningful data
-            has_data = (
-                len(content.get("events", [])) > 0 or 
-                len(content.get("restaurants", [])) > 0 or 
-                len(content.get("alerts", [])) > 0
-            )
-            
-            if has_data or attempt == max_retries - 1:
-                return {
-                    "success": True, 
-                    "data": content, 
-                    "citations": result.get("citations", []),
-                    "attempt": attempt + 1
-                }
-            else:
-                print(f"Attempt {attempt + 1}: Got empty arrays, retrying...")
-                
-        except Exception as e:
-            print(f"Attempt {attempt + 1} failed: {e}")
-            if attempt == max_retries - 1:
-                return {"success": False, "error": str(e)}
+    # Fetch only what is missing or stale, and merge in the categories that are still fresh
+    to_fetch = tuple(category for category in LOCAL_INFO_CATEGORIES if category in missing or category in stale)
+    response = await UPSTREAM_FLIGHTS.do(local_data_flight(lat, lng, to_fetch),
+                                         in_lane(INTERACTIVE, lambda: fetch_local_data(lat, lng, to_fetch)))
+    if response.get("success"):
+        # A stale category whose refresh failed keeps its cached value rather than coming back empty
+        failed = response.get("failed", [])
+        kept = {category: entry for category, entry in entries.items() if category not in to_fetch or category in failed}
+        if kept:
+            fetched = {**response, "data": {c: items for c, items in response["data"].items() if c not in kept}}
+            response = {**merge_cached_categories(fetched, kept),
+                        "refreshed": [category for category in to_fetch if category not in failed]}
+            if any(category in stale for category in kept):
+                response["stale"] = True
+                response["stale_categories"] = [category for category in kept if category in stale]
+    elif entries:
+        # Whatever is cached, stale included, beats an error
+        response = {**merge_cached_categories({"success": True, "cached": True}, entries), "error": response.get("error")}
+    return degrade_to_index(response, indexed, lat, lng)
+
+async def fetch_local_data(lat: float, lng: float, categories: tuple = LOCAL_INFO_CATEGORIES):
+    """Fetch some categories of local data (all in one call unless fanned out) and cache each one."""
+    prompt = local_data_prompt(lat, lng)
+    
+    try:
+        if categories == LOCAL_INFO_CATEGORIES and not LOCAL_DATA_FANOUT:
+            result, attempts = await fetch_structured_local_info(prompt)
+        else:
+            result, attempts = await fetch_local_info_fanout(prompt, categories=categories)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    
+    response = {
+        "success": True, 
+        "data": dedupe_pois(await resolve_locations(result["content"], lat, lng)), 
+        "citations": result["citations"],
+        "attempt": attempts
+    }
+    failed = list(result.get("failed", []))
+    # A single category can really be empty (no alerts nearby); an empty full answer is more likely a bad generation
+    if categories == LOCAL_INFO_CATEGORIES and not has_local_data(response["data"], categories):
+        failed = list(categories)
+    if failed:
+        response["failed"] = failed
+    remembered = tuple(c for c in categories if c not in failed)
+    if remembered:
+        remember_categories(lat, lng, response, remembered)
+    return response
+
+@rt("/api/local-data/tiles")
+async def get_local_data_tiles(south: float, west: float, north: float, east: float):
+    if south > north:
+        return {"success": False, "error": "south must not be greater than north"}
+    count = tile_count(south, west, north, east, TILE_ZOOM)
+    if count > TILE_MAX_TILES:
+        return {"success": False, "error": f"Bounding box spans {count} tiles at zoom {TILE_ZOOM}; zoom in (limit {TILE_MAX_TILES})"}
+    
+    tiles = tiles_in_bbox(south, west, north, east, TILE_ZOOM)
+    fetches = asyncio.Semaphore(TILE_FETCH_CONCURRENCY)
+    
+    async def load_tile(x: int, y: int):
+        lat, lng = tile_center(x, y, TILE_ZOOM)
+        found = lookup_local_data(lat, lng)
+        entries, stale, missing = found
+        if not missing:
+            return cached_local_data(lat, lng, entries, stale)
+        async with fetches:
+            return await load_local_data(lat, lng, found)
+    
+    responses = await asyncio.gather(*(load_tile(x, y) for x, y in tiles))
+    
+    def visible(item) -> bool:
+        position = poi_position(item)
+        return position is None or in_bbox(*position, south, west, north, east)
+    
+    data = {category: [] for category in LOCAL_INFO_CATEGORIES}
+    citations = []
+    for response in responses:
+        if not response.get("success"):
+            continue
+        for category in LOCAL_INFO_CATEGORIES:
+            data[category].extend(item for item in response["data"].get(category, []) if visible(item))
+        citations.extend(c for c in response.get("citations", []) if c not in citations)
+    
+    response = {
+        "success": any(response.get("success") for response in responses),
+        "data": dedupe_pois(data),
+        "citations": citations,
+        "zoom": TILE_ZOOM,
+        "tiles": [
+            {"x": x, "y": y, "success": bool(response.get("success")),
+             # Answers from the POI index are served without an upstream call, like cache hits
+             "cached": bool(response.get("cached")) or response.get("source") == "index",
+             "stale": bool(response.get("stale"))}
+            for (x, y), response in zip(tiles, responses)
+        ]
+    }
+    if not response["success"]:
+        response["error"] = next((r.get("error") for r in responses if r.get("error")), "No tile could be loaded")
+    return response
 
 @rt("/api/local-data/debug")
-def debug_data(lat: float = 30.59077127702062, lng: float = -97.8626356236235):
-    api = PerplexityAPI()
+async def debug_data(lat: float = 30.59077127702062, lng: float = -97.8626356236235):
+    prompt = local_data_prompt(lat, lng)
     
-    prompt = f"Find current information near coordinates {lat}, {lng}"
+    try:
+        result, attempts = await fetch_structured_local_info(prompt)
+    except Exception as e:
+        return Div(
+            H2("Error occurred:"),
+            P(str(e)),
+            style="padding: 20px;"
+        )
     
-    max_retries = 10
-    for attempt in range(max_retries):
-        try:
-            result = api.geo_structured_output_with_citations(
-                prompt=prompt,
-                schema=LOCAL_INFO_SCHEMA
-            )
-            
-            import json
-            if isinstance(result, str):
-                result = json.loads(result)
-            
-            # Check if we got meaningful data
-            has_data = (
-                len(result.get("events", [])) > 0 or 
-                len(result.get("restaurants", [])) > 0 or 
-                len(result.get("alerts", [])) > 0
-            )
-            
-            if has_data or attempt == max_retries - 1:
-                return Div(
-                    H2(f"Debug: Structured Response (Attempt {attempt + 1})"),
-                    Pre(json.dumps(result, indent=2)),
-                    style="padding: 20px; font-family: monospace;"
-                )
-            else:
-                print(f"Attempt {attempt + 1}: Got empty arrays, retrying...")
-                
-        except Exception as e:
-            if attempt == max_retries - 1:
-                return Div(
-                    H2("Error occurred:"),
-                    P(str(e)),
-                    style="padding: 20px;"
-                )
+    return Div(
+        H2(f"Debug: Structured Response (Attempt {attempts})"),
+        Pre(json.dumps(result, indent=2)),
+        style="padding: 20px; font-family: monospace;"
+    )
 
 @rt("/api/local-data-md")
-def get_local_data_md(lat: float, lng: float):
+async def get_local_data_md(lat: float, lng: float):
     # This will call Perplexity API for local info
-    api = PerplexityAPI()
+    api = get_shared_async_client()
     
     # We'll query for different types of local content
     prompt = f"Find current local events, popular restaurants, and any alerts or news happening near coordinates {lat}, {lng}. Include specific names, addresses, and current status."
     
-    result = api.location_based_search(
+    result = await api.location_based_search(
         prompt=prompt,
         latitude=lat,
         longitude=lng,
@@ -482,12 +856,10 @@ def get_local_data_md(lat: float, lng: float):
 
 @rt("/api/share-location", methods=["POST"])
 def create_shared_location(data: dict):
-    global SHARED_LOCATIONS
-    
     # Generate unique ID for this shared location
     location_id = str(uuid.uuid4())[:8]
     
-    # Store the location data in memory with proper type conversion
+    # Store the location data with proper type conversion
     shared_data = {
         "id": location_id,
         "name": data.get("name"),
@@ -502,80 +874,261 @@ def create_shared_location(data: dict):
         "shared_at": str(datetime.now())
     }
     
-    # Save to in-memory storage
-    SHARED_LOCATIONS[location_id] = shared_data
+    SHARED_LOCATIONS.put(location_id, shared_data)
     
     return {"success": True, "location_id": location_id, "share_url": f"/shared/{location_id}"}
 
 @rt("/api/get-shared-location/{location_id}")
 def get_shared_location(location_id: str):
-    global SHARED_LOCATIONS
-    
-    if location_id in SHARED_LOCATIONS:
-        return {"success": True, "data": SHARED_LOCATIONS[location_id]}
+    shared_data = SHARED_LOCATIONS.get(location_id)
+    if shared_data is not None:
+        return {"success": True, "data": shared_data}
     else:
         return {"success": False, "error": "Shared location not found"}
 
 # Optional: Add a route to see all shared locations (for debugging)
 @rt("/api/shared-locations")
-def list_shared_locations():
-    global SHARED_LOCATIONS
-    return {"shared_locations": list(SHARED_LOCATIONS.keys()), "count": len(SHARED_LOCATIONS)}
+def list_shared_locations(offset: int = 0, limit: int = 50):
+    offset, limit = max(0, offset), max(1, min(limit, 500))
+    ids, total = SHARED_LOCATIONS.list(offset=offset, limit=limit)
+    return {"shared_locations": ids, "count": total, "offset": offset, "limit": limit}
+
+# Answer "what's within radius meters" from recently returned POIs, without an upstream call
+@rt("/api/nearby")
+def get_nearby(lat: float, lng: float, radius: float = 1000, category: str = ""):
+    categories = [category] if category else LOCAL_INFO_CATEGORIES
+    data = POI_INDEX.nearby(lat, lng, min(radius, 20000), categories, POI_INDEX_MAX_AGE)
+    return {"success": True, "data": data, "source": "index"}
+
+# Cache hit/miss and request coalescing counters (for debugging)
+@rt("/api/cache-stats")
+def cache_stats():
+    hedger = get_shared_async_client().hedger
+    return {
+        "local_data": {category: cache.stats() for category, cache in LOCAL_DATA_CACHES.items()},
+        "search_results": LOCAL_DATA_CACHE.stats(),
+        "single_flight": UPSTREAM_FLIGHTS.stats(),
+        "retry_budget": UPSTREAM_RETRY_BUDGET.stats(),
+        "hedging": hedger.stats() if hedger else None,
+        "poi_index": POI_INDEX.stats(),
+        "location_resolver": LOCATION_RESOLVER.stats(),
+        "suggestions": SUGGEST_INDEX.stats(),
+        "static_assets": STATIC_ASSETS.stats(),
+        "location_insights": INSIGHTS_CACHE.stats(),
+        "insights_prefetch": INSIGHTS_PREFETCHER.stats(),
+        "cassette": get_cassette().stats() if get_cassette() else None,
+        "rate_limit": get_shared_async_client().limiter.stats(),
+        "circuit_breakers": get_shared_async_client().breakers.stats()
+    }
+
+# Route and upstream latency histograms in the Prometheus text format (see metrics.py)
+@rt("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @rt("/api/search-local")
-def search_local_data(lat: float, lng: float, query: str):
-    api = PerplexityAPI()
+async def search_local_data(lat: float, lng: float, query: str, session):
+    await record_search(lat, lng, query)
+    session_id = prefetch_session(session)
+    response = await load_search_results(lat, lng, query)
+    schedule_prefetch(session_id, lat, lng, response)
+    return response
+
+async def record_search(lat: float, lng: float, query: str) -> None:
+    """Count a submitted query towards suggestions for its area, snapshotting the index now and then."""
+    SUGGEST_INDEX.record(lat, lng, query)
+    await asyncio.to_thread(SUGGEST_INDEX.maybe_save, SUGGEST_SNAPSHOT, SUGGEST_SNAPSHOT_INTERVAL)
+
+async def load_search_results(lat: float, lng: float, query: str):
+    cache_key = LOCAL_DATA_CACHE.key("search-local", lat, lng, query)
+    cached = cached_response(cache_key)
+    if cached is not None:
+        return {**cached, "query": query}
     
-    # Create a custom prompt based on user query
-    prompt = f"""Find information about "{query}" near coordinates {lat}, {lng}. 
+    response = await UPSTREAM_FLIGHTS.do(cache_key, in_lane(INTERACTIVE, lambda: fetch_search_results(lat, lng, query, cache_key)))
+    return {**response, "query": query}
+
+async def fetch_search_results(lat: float, lng: float, query: str, cache_key: tuple):
+    prompt = search_prompt(lat, lng, query)
     
-    Based on the query, categorize results appropriately:
-    - If it's about events/entertainment/activities, put in events array
-    - If it's about food/dining/restaurants, put in restaurants array  
-    - If it's about alerts/traffic/weather/safety, put in alerts array
+    try:
+        result, attempts = await fetch_structured_local_info(prompt, label="Search attempt")
+    except Exception as e:
+        return {"success": False, "error": str(e)}
     
-    Include relevant results for the user's specific request: "{query}"
+    response = {
+        "success": True, 
+        "data": dedupe_pois(await resolve_locations(result["content"], lat, lng)), 
+        "citations": result["citations"],
+        "query": query,
+        "attempt": attempts
+    }
+    if has_local_data(response["data"]):
+        remember_local_data(cache_key, response)
+    return response
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def publish_pois(publish, data: dict) -> None:
+    for category in LOCAL_INFO_CATEGORIES:
+        for item in data.get(category, []):
+            publish(("poi", {"category": category, "item": item}))
+
+async def stream_structured_local_info(prompt: str, publish, label: str = "Stream attempt"):
+    """Stream a structured query, publishing a "poi" event per item as soon as it is parsed.
+
+    Failures and empty results are retried like fetch_structured_local_info until an item has been
+    published; after that a broken stream keeps what it got. Returns (result, complete), where an
+    incomplete result is partial and should not be cached.
     """
+    api = get_shared_async_client()
+    streamed = {category: [] for category in LOCAL_INFO_CATEGORIES}
+    state = {"citations": [], "complete": False, "parser": None}
     
-    max_retries = 10
-    for attempt in range(max_retries):
+    async def attempt():
+        parser = state["parser"] = PoiStreamParser()
         try:
-            result = api.geo_structured_output_with_citations(
-                prompt=prompt,
-                schema=LOCAL_INFO_SCHEMA
-            )
-            
-            import json
-            content = result["content"]
-            if isinstance(content, str):
-                content = json.loads(content)
-            
-            # Check if we got meaningful data
-            has_data = (
-                len(content.get("events", [])) > 0 or 
-                len(content.get("restaurants", [])) > 0 or 
-                len(content.get("alerts", [])) > 0
-            )
-            
-            if has_data or attempt == max_retries - 1:
-                return {
-                    "success": True, 
-                    "data": content, 
-                    "citations": result.get("citations", []),
-                    "query": query,
-                    "attempt": attempt + 1
-                }
-            else:
-                print(f"Search attempt {attempt + 1}: Got empty arrays, retrying...")
-                
+            async for kind, value in api.stream_geo_structured_output_with_citations(prompt=prompt, schema=LOCAL_INFO_SCHEMA):
+                if kind == "citations":
+                    state["citations"] = value
+                    state["complete"] = True
+                    continue
+                for category, item in parser.feed(value):
+                    if category in streamed:
+                        streamed[category].append(item)
+                        publish(("poi", {"category": category, "item": item}))
+        except Exception as e:
+            # Items already sent cannot be taken back, so only a stream that produced nothing is retried
+            if not has_local_data(streamed):
+                raise
+            print(f"{label} interrupted: {e!r}")
+        result = {"content": streamed, "citations": state["citations"]}
+        if not has_local_data(streamed):
+            raise EmptyResultError(result)
+        return result
+    
+    try:
+        result, _ = await retry_call(attempt, UPSTREAM_RETRY_POLICY, UPSTREAM_RETRY_BUDGET, label=label)
+    except Exception:
+        if not has_local_data(streamed):
+            raise
+        # E.g. the retry deadline cut a stream short that had already produced items
+        return {"content": streamed, "citations": state["citations"]}, False
+    if state["complete"]:
+        result["content"] = {**streamed, **(state["parser"].document() or {})}
+    return result, state["complete"]
+
+async def publish_local_data(lat: float, lng: float, found: tuple, publish) -> None:
+    """Publish a cell's local data as "poi" events and a final "done"; shared by every stream of the cell."""
+    # Runs as the flight's own task, so this only affects its upstream calls
+    upstream_lane.set(INTERACTIVE)
+    if len(found[2]) < len(LOCAL_INFO_CATEGORIES):
+        # Partly cached: fetch just the missing and stale categories through the coalesced JSON path
+        response = await load_local_data(lat, lng, found)
+        publish_pois(publish, response.get("data", {}))
+        publish(("done", response))
+        return
+    
+    indexed, response = index_answer(lat, lng)
+    if response is None:
+        try:
+            result, complete = await stream_structured_local_info(local_data_prompt(lat, lng), publish)
+            response = {
+                "success": True,
+                "data": dedupe_pois(await resolve_locations(result["content"], lat, lng)),
+                "citations": result["citations"]
+            }
+            if complete and has_local_data(response["data"]):
+                remember_categories(lat, lng, response, LOCAL_INFO_CATEGORIES)
         except Exception as e:
-            print(f"Search attempt {attempt + 1} failed: {e}")
-            if attempt == max_retries - 1:
-                return {"success": False, "error": str(e)}
+            response = {"success": False, "error": str(e)}
+        response = degrade_to_index(response, indexed, lat, lng)
+        if response.get("source") == "index":
+            publish_pois(publish, response["data"])
+    else:
+        publish_pois(publish, response["data"])
+    publish(("done", response))
+
+async def publish_search_results(lat: float, lng: float, query: str, cache_key: tuple, publish) -> None:
+    """Publish a search's results as "poi" events and a final "done"; shared by every stream of the query."""
+    upstream_lane.set(INTERACTIVE)
+    try:
+        result, complete = await stream_structured_local_info(search_prompt(lat, lng, query), publish, label="Search stream attempt")
+        response = {
+            "success": True,
+            "data": dedupe_pois(await resolve_locations(result["content"], lat, lng)),
+            "citations": result["citations"],
+            "query": query
+        }
+        if complete and has_local_data(response["data"]):
+            remember_local_data(cache_key, response)
+    except Exception as e:
+        response = {"success": False, "error": str(e), "query": query}
+    publish(("done", response))
+
+async def relay_events(events, lat: float, lng: float, session_id: str = None):
+    """Format shared (event, data) pairs as SSE for one client, scheduling its prefetches once "done" arrives."""
+    try:
+        async for event, data in events:
+            if event == "done":
+                schedule_prefetch(session_id, lat, lng, data)
+            yield sse(event, data)
+    except Exception as e:
+        print(f"Streaming failed: {e!r}")
+        yield sse("done", {"success": False, "error": str(e)})
+
+async def replay_response(response: dict):
+    """Events for a response that is already complete, e.g. from the cache."""
+    for category in LOCAL_INFO_CATEGORIES:
+        for item in response["data"].get(category, []):
+            yield "poi", {"category": category, "item": item}
+    yield "done", response
+
+@rt("/api/local-data/stream")
+async def stream_local_data(lat: float, lng: float, session):
+    session_id = prefetch_session(session)
+    found = lookup_local_data(lat, lng)
+    entries, stale, missing = found
+    if not missing:
+        events = replay_response(cached_local_data(lat, lng, entries, stale))
+    else:
+        # Concurrent streams of one cell share a single upstream stream
+        events = UPSTREAM_FLIGHTS.stream(("stream",) + local_data_flight(lat, lng, LOCAL_INFO_CATEGORIES),
+                                         lambda publish: publish_local_data(lat, lng, found, publish))
+    return EventStream(relay_events(events, lat, lng, session_id))
+
+@rt("/api/search-local/stream")
+async def stream_search_local_data(lat: float, lng: float, query: str, session):
+    await record_search(lat, lng, query)
+    session_id = prefetch_session(session)
+    cache_key = LOCAL_DATA_CACHE.key("search-local", lat, lng, query)
+    cached = cached_response(cache_key)
+    if cached is not None:
+        events = replay_response({**cached, "query": query})
+    else:
+        events = UPSTREAM_FLIGHTS.stream(("stream", cache_key),
+                                         lambda publish: publish_search_results(lat, lng, query, cache_key, publish))
+    return EventStream(relay_events(events, lat, lng, session_id))
 
 @rt("/api/search-suggestions")
-def get_search_suggestions(query: str, lat: float, lng: float):
-    api = PerplexityAPI()
+async def get_search_suggestions(query: str, lat: float, lng: float):
+    suggestions, cold = SUGGEST_INDEX.lookup(lat, lng, query)
+    if not cold:
+        return {"success": True, "suggestions": suggestions, "source": "index"}
+    
+    flight_key = ("search-suggestions", SUGGEST_INDEX.cell(lat, lng), normalize_query(query))
+    fetched = await UPSTREAM_FLIGHTS.do(flight_key, lambda: fetch_search_suggestions(query, lat, lng))
+    if fetched is None:
+        return {"success": bool(suggestions), "suggestions": suggestions}
+    
+    seen = {normalize_query(suggestion) for suggestion in suggestions}
+    suggestions += [suggestion for suggestion in fetched if normalize_query(suggestion) not in seen]
+    return {"success": bool(suggestions), "suggestions": suggestions[:5]}
+
+async def fetch_search_suggestions(query: str, lat: float, lng: float):
+    """Ask the upstream for suggestions for a cold prefix and add them to the index; None on failure."""
+    api = get_shared_async_client()
     
     # Create a prompt for search suggestions
     prompt = f"""Based on the partial search query "{query}" and location coordinates {lat}, {lng}, suggest 5 relevant local search terms that users might be looking for.
@@ -593,14 +1146,14 @@ def get_search_suggestions(query: str, lat: float, lng: float):
     
     try:
         # Use basic query for faster response
-        result = api.basic_query(prompt)
+        result = await api.basic_query(prompt)
         
         # Try to parse as JSON, fallback to simple parsing
-        import json
         try:
             suggestions = json.loads(result)
-            if isinstance(suggestions, list):
-                return {"success": True, "suggestions": suggestions[:5]}
+            if not isinstance(suggestions, list):
+                return None
+            suggestions = [str(suggestion) for suggestion in suggestions[:5]]
         except:
             # Fallback: extract suggestions from text
             lines = result.split('\n')
@@ -612,27 +1165,46 @@ def get_search_suggestions(query: str, lat: float, lng: float):
                     end = line.find('"', start + 1)
                     if start != -1 and end != -1:
                         suggestions.append(line[start+1:end])
-            
-            return {"success": True, "suggestions": suggestions}
         
-        return {"success": False, "suggestions": []}
+        SUGGEST_INDEX.add_backfill(lat, lng, query, suggestions)
+        await asyncio.to_thread(SUGGEST_INDEX.maybe_save, SUGGEST_SNAPSHOT, SUGGEST_SNAPSHOT_INTERVAL)
+        return suggestions
         
     except Exception as e:
         print(f"Error getting search suggestions: {e}")
-        return {"success": False, "suggestions": []}
+        return None
 
 @rt("/api/location-insights")
-def get_location_insights(name: str, type: str, description: str, address: str = ""):
-    api = PerplexityAPI()
+async def get_location_insights(name: str, type: str, description: str, address: str = ""):
+    key = venue_fingerprint(name, type, address)
+    cached = await asyncio.to_thread(INSIGHTS_CACHE.get, key)
+    if cached is not None:
+        insights, stale = cached
+        if stale:
+            refresh_in_background(("location-insights", key), lambda: fetch_location_insights(key, name, type, description, address))
+        return {"success": True, "insights": insights, "cached": True, "stale": stale}
+    
+    return await UPSTREAM_FLIGHTS.do(("location-insights", key), lambda: fetch_location_insights(key, name, type, description, address))
+
+async def prefetch_insights(job: dict) -> None:
+    key = venue_fingerprint(job["name"], job["type"], job["address"])
+    if not await asyncio.to_thread(INSIGHTS_CACHE.is_fresh, key):
+        await UPSTREAM_FLIGHTS.do(background_flight(("location-insights", key)),
+                                  in_lane(BACKGROUND, lambda: fetch_location_insights(key, **job)))
+
+async def fetch_location_insights(key: str, name: str, type: str, description: str, address: str):
+    api = get_shared_async_client()
     
     try:
-        insights = api.get_location_insights(
+        insights = await api.get_location_insights(
             location_name=name,
             location_type=type,
             description=description,
             address=address
         )
         
+        if insights:
+            await asyncio.to_thread(INSIGHTS_CACHE.put, key, insights)
         return {"success": True, "insights": insights}
         
     except Exception as e:
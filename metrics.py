@@ -0,0 +1,240 @@
+# Prometheus-format metrics with per-thread shards
+import time
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 6, 8, 10)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        """Each thread writes only its own shard, so updates take no lock; collection sums the shards."""
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple, object]] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> Dict[Tuple, object]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def _collect(self) -> List[Tuple[Tuple, object]]:
+        with self._lock:
+            shards = list(self._shards)
+        # list() of a dict's items is taken atomically under the GIL
+        return [item for shard in shards for item in list(shard.items())]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        totals: Dict[Tuple, float] = {}
+        for labels, value in self._collect():
+            totals[labels] = totals.get(labels, 0) + value
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_format(value)}" for labels, value in sorted(totals.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels) -> None:
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            # Per-bucket counts (the last is +Inf), then the sum
+            entry = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def render(self) -> List[str]:
+        totals: Dict[Tuple, List[float]] = {}
+        for labels, entry in self._collect():
+            total = totals.setdefault(labels, [0] * len(entry))
+            for i, value in enumerate(entry):
+                total[i] += value
+        lines = []
+        for labels, entry in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_format(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_format(entry[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def _register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "citypulse_http_request_duration_seconds", "Time to serve a request, until its last body chunk.", ["route"])
+HTTP_REQUESTS = REGISTRY.counter(
+    "citypulse_http_requests_total", "Requests served, by route and status code.", ["route", "status"])
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "citypulse_http_requests_in_flight", "Requests currently being served.")
+
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "citypulse_upstream_request_duration_seconds", "Latency of one upstream HTTP call.", ["method", "model", "outcome"])
+UPSTREAM_IN_FLIGHT = REGISTRY.gauge(
+    "citypulse_upstream_requests_in_flight", "Upstream HTTP calls currently in flight.")
+UPSTREAM_REQUEST_BYTES = REGISTRY.histogram(
+    "citypulse_upstream_request_bytes", "Size of upstream request payloads.", ["method"], SIZE_BUCKETS)
+UPSTREAM_RESPONSE_BYTES = REGISTRY.histogram(
+    "citypulse_upstream_response_bytes", "Size of decoded upstream response bodies.", ["method"], SIZE_BUCKETS)
+
+UPSTREAM_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "citypulse_upstream_queue_wait_seconds", "Time an upstream call waited for the rate limiter, by lane.", ["lane"])
+UPSTREAM_QUEUED = REGISTRY.gauge(
+    "citypulse_upstream_queued", "Upstream calls waiting for the rate limiter, by lane.", ["lane"])
+UPSTREAM_THROTTLED = REGISTRY.counter(
+    "citypulse_upstream_throttled_total", "429 responses that paused the rate limiter.")
+
+CIRCUIT_STATE = REGISTRY.gauge(
+    "citypulse_circuit_state", "1 for the current state of each model's circuit breaker.", ["model", "state"])
+CIRCUIT_TRANSITIONS = REGISTRY.counter(
+    "citypulse_circuit_transitions_total", "Circuit breaker state changes, by the state entered.", ["model", "state"])
+CIRCUIT_REJECTED = REGISTRY.counter(
+    "citypulse_circuit_rejected_total", "Calls failed fast by an open circuit breaker.", ["model"])
+
+RETRY_ATTEMPTS = REGISTRY.histogram(
+    "citypulse_upstream_attempts", "Attempts used by one retried upstream operation.", ["call"], ATTEMPT_BUCKETS)
+EMPTY_RESULT_RETRIES = REGISTRY.counter(
+    "citypulse_upstream_empty_results_total", "Attempts that returned empty results.", ["call"])
+
+
+class track_upstream:
+    def __init__(self, method: str, model: str):
+        """Time one upstream call; set `outcome` (e.g. the status code) inside the block, exceptions name themselves."""
+        self.method = method
+        self.model = model
+        self.outcome = "ok"
+
+    def __enter__(self) -> "track_upstream":
+        self.started = time.perf_counter()
+        UPSTREAM_IN_FLIGHT.inc()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        UPSTREAM_IN_FLIGHT.dec()
+        outcome = exc_type.__name__ if exc_type is not None and self.outcome == "ok" else self.outcome
+        UPSTREAM_SECONDS.observe(time.perf_counter() - self.started, self.method, self.model, outcome)
+
+    def sizes(self, request_bytes: int, response_bytes: int) -> None:
+        UPSTREAM_REQUEST_BYTES.observe(request_bytes, self.method)
+        UPSTREAM_RESPONSE_BYTES.observe(response_bytes, self.method)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        """ASGI middleware timing every HTTP request under its route template (e.g. /shared/{location_id})."""
+        self.app = app
+        self._paths: Dict[object, str] = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._paths.get(endpoint)
+        if path is None:
+            routes = getattr(scope.get("app"), "routes", [])
+            self._paths = {getattr(route, "endpoint", None): getattr(route, "path", "") for route in routes}
+            path = self._paths.get(endpoint, "unmatched")
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = [500]
+        finished = [False]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished[0] = True
+                route = self._route(scope)
+                HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, route)
+                HTTP_REQUESTS.inc(route, str(status[0]))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            if not finished[0]:
+                route = self._route(scope)
+                HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, route)
+                HTTP_REQUESTS.inc(route, str(status[0]))
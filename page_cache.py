@@ -0,0 +1,70 @@
+# Pages rendered once at startup and served from bytes with strong ETags
+import re
+import html
+import json
+import hashlib
+import inspect
+from typing import Any, Callable, Iterable, Optional
+
+from fasthtml.common import Html, Head, Body, Link, Response, to_xml, flat_xt
+
+HEAD_TAGS = ("title", "meta", "link", "style", "base")
+_SLOT = re.compile(r"__PAGE_SLOT_(\w+)__")
+
+
+def slot(name: str) -> str:
+    """Placeholder marking where a per-request value goes in a pre-rendered page."""
+    return f"__PAGE_SLOT_{name}__"
+
+
+def script_value(value: Any) -> str:
+    """JSON-encode a value for an inline <script> so it cannot end the string or the tag."""
+    return json.dumps(value).replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class RenderedPage:
+    def __init__(self, app, page: Any, script_slots: Iterable[str] = (), rewrite: Optional[Callable[[str], str]] = None):
+        """Render a page the way FastHTML renders a full-page response, once.
+
+        Per-request values are substituted into slots: the canonical link (which FastHTML derives
+        from the request URL) and any `script_slots` the page placed with slot(name) inside a Script.
+        `rewrite` post-processes the rendered HTML, e.g. to point asset links at fingerprinted URLs.
+        """
+        items = page if isinstance(page, tuple) else (page,)
+        heads = [item for item in items if getattr(item, "tag", "") in HEAD_TAGS]
+        body = [item for item in items if getattr(item, "tag", "") not in HEAD_TAGS]
+        canonical = [Link(rel="canonical", href=slot("canonical"))] if app.canonical else []
+        # Body wrappers may take the request; there is none at startup
+        wrap_args = (tuple(body), None) if len(inspect.signature(app.body_wrap).parameters) > 1 else (tuple(body),)
+        document = Html(
+            Head(*heads, *canonical, *flat_xt(app.hdrs)),
+            Body(app.body_wrap(*wrap_args), *flat_xt(app.ftrs), **app.bodykw),
+            **app.htmlkw
+        )
+        self.script_slots = set(script_slots)
+        rendered = to_xml(document)
+        if rewrite is not None:
+            rendered = rewrite(rendered)
+        # Alternating literal bytes and slot names
+        self.parts = [part if i % 2 else part.encode() for i, part in enumerate(_SLOT.split(rendered))]
+
+    def render(self, request, **values: Any) -> bytes:
+        fills = {"canonical": html.escape(str(request.url).replace("http://", "https://", 1), quote=True)}
+        fills.update({name: script_value(values[name]) for name in self.script_slots})
+        return b"".join(part if i % 2 == 0 else fills[part].encode() for i, part in enumerate(self.parts))
+
+    def response(self, request, **values: Any) -> Response:
+        """Serve the page, or 304 Not Modified when the client already has this exact body."""
+        body = self.render(request, **values)
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "HX-Request, HX-History-Restore-Request"}
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="text/html", headers=headers)
@@ -1,34 +1,220 @@
 # Perplexity API
 import os
+import json
+import atexit
+import threading
+import httpx
 import requests
-from typing import List, Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional, Tuple
 
-class PerplexityAPI:
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize the Perplexity API client."""
+from hedging import Hedger
+from cassette import Cassette, CassetteAdapter, RecordingTransport, ReplayTransport
+from metrics import track_upstream
+from rate_limit import RateLimiter, upstream_lane
+from circuit_breaker import CircuitBreakers
+
+# Transport settings shared by every client in the process
+POOL_SIZE = int(os.environ.get("PERPLEXITY_POOL_SIZE", 20))
+ASYNC_POOL_SIZE = int(os.environ.get("PERPLEXITY_ASYNC_POOL_SIZE", 200))
+CONNECT_TIMEOUT = float(os.environ.get("PERPLEXITY_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("PERPLEXITY_READ_TIMEOUT", 60))
+GZIP = os.environ.get("PERPLEXITY_GZIP", "1") != "0"
+HEDGE = os.environ.get("PERPLEXITY_HEDGE", "0") == "1"
+# Client-side limits on upstream calls (see rate_limit.py); PERPLEXITY_RPM=0 disables the rate limit
+MAX_CONCURRENCY = int(os.environ.get("PERPLEXITY_MAX_CONCURRENCY", 32))
+RESERVED_INTERACTIVE = int(os.environ.get("PERPLEXITY_RESERVED_INTERACTIVE", 8))
+RPM = float(os.environ.get("PERPLEXITY_RPM", 0))
+RPM_BURST = float(os.environ.get("PERPLEXITY_RPM_BURST", 10))
+# Point at a stand-in server (see bench/fake_perplexity.py) to run without the paid upstream
+BASE_URL = os.environ.get("PERPLEXITY_BASE_URL", "https://api.perplexity.ai/chat/completions")
+# Record upstream traffic to, or replay it from, a cassette file (see cassette.py)
+CASSETTE = os.environ.get("PERPLEXITY_CASSETTE")
+CASSETTE_MODE = os.environ.get("PERPLEXITY_CASSETTE_MODE", "replay")
+CASSETTE_SPEED = float(os.environ.get("PERPLEXITY_CASSETTE_SPEED", 1))
+
+_session: Optional[requests.Session] = None
+_shared_client: Optional["PerplexityAPI"] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_shared_async_client: Optional["AsyncPerplexityAPI"] = None
+_cassette: Optional[Cassette] = None
+_rate_limiter: Optional[RateLimiter] = None
+_circuit_breakers: Optional[CircuitBreakers] = None
+# Re-entrant because the shared clients are built under it and fetch the shared pools themselves
+_lock = threading.RLock()
+
+def get_cassette() -> Optional[Cassette]:
+    """Return the process-wide cassette if PERPLEXITY_CASSETTE is set."""
+    global _cassette
+    if _cassette is None and CASSETTE:
+        with _lock:
+            if _cassette is None:
+                _cassette = Cassette(CASSETTE, CASSETTE_MODE)
+                atexit.register(_cassette.close)
+    return _cassette
+
+def get_session() -> requests.Session:
+    """Return the process-wide keep-alive session, creating its connection pool on first use."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                cassette = get_cassette()
+                if cassette is not None:
+                    adapter = CassetteAdapter(cassette, CASSETTE_SPEED, pool_connections=1, pool_maxsize=POOL_SIZE)
+                else:
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, pool_block=False)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+def get_shared_client() -> "PerplexityAPI":
+    """Return a process-wide PerplexityAPI instance."""
+    global _shared_client
+    if _shared_client is None:
+        with _lock:
+            if _shared_client is None:
+                _shared_client = PerplexityAPI()
+    return _shared_client
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the process-wide pooled httpx client used by AsyncPerplexityAPI."""
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                limits = httpx.Limits(max_connections=ASYNC_POOL_SIZE, max_keepalive_connections=ASYNC_POOL_SIZE)
+                cassette = get_cassette()
+                if cassette is None:
+                    _async_client = httpx.AsyncClient(limits=limits)
+                elif cassette.mode == "record":
+                    transport = RecordingTransport(httpx.AsyncHTTPTransport(limits=limits), cassette)
+                    _async_client = httpx.AsyncClient(transport=transport)
+                else:
+                    _async_client = httpx.AsyncClient(transport=ReplayTransport(cassette, CASSETTE_SPEED))
+    return _async_client
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide limiter shared by every AsyncPerplexityAPI."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(MAX_CONCURRENCY, RPM, RPM_BURST, RESERVED_INTERACTIVE)
+    return _rate_limiter
+
+def get_circuit_breakers() -> CircuitBreakers:
+    """Return the process-wide per-model circuit breakers (settings in circuit_breaker.py)."""
+    global _circuit_breakers
+    if _circuit_breakers is None:
+        with _lock:
+            if _circuit_breakers is None:
+                _circuit_breakers = CircuitBreakers()
+    return _circuit_breakers
+
+def get_shared_async_client() -> "AsyncPerplexityAPI":
+    """Return a process-wide AsyncPerplexityAPI instance."""
+    global _shared_async_client
+    if _shared_async_client is None:
+        with _lock:
+            if _shared_async_client is None:
+                _shared_async_client = AsyncPerplexityAPI(hedger=Hedger() if HEDGE else None)
+    return _shared_async_client
+
+# Per-category lines of the local discovery system prompt: (heading, what to find, example id)
+LOCAL_INFO_CATEGORY_PROMPTS = {
+    "events": ("EVENTS", "Live events happening today/this week (concerts, festivals, sports, etc.)", "event_001"),
+    "restaurants": ("RESTAURANTS", "Popular local restaurants and cafes currently open", "restaurant_001"),
+    "alerts": ("ALERTS", "Any weather, traffic, or safety alerts for the area", "alert_001")
+}
+
+def local_info_system_prompt(schema: Dict[str, Any]) -> str:
+    """Local discovery system prompt naming only the categories in the schema, so per-category calls stay small."""
+    categories = [c for c in LOCAL_INFO_CATEGORY_PROMPTS if c in schema.get("properties", {})] or list(LOCAL_INFO_CATEGORY_PROMPTS)
+    headings = "\n".join(f"{i}. {LOCAL_INFO_CATEGORY_PROMPTS[c][0]}: {LOCAL_INFO_CATEGORY_PROMPTS[c][1]}"
+                         for i, c in enumerate(categories, 1))
+    examples = ", ".join(f'"{LOCAL_INFO_CATEGORY_PROMPTS[c][2]}"' for c in categories)
+    if len(categories) == 1:
+        intro = ""
+        quota = "Try to include at least 5 items."
+        shape = f"Return as JSON with only the {categories[0]} array."
+    else:
+        intro = """We're building an app that helps people discover what's happening right around them, whether they're tourists or locals. The key features would be:
+
+1. Live local events (concerts, meetups, pop-ups happening now)
+2. Contextual business info (what's open, busy, or recommended nearby)
+3. Real-time alerts (weather, traffic, safety updates)
+4. Smart recommendations based on location and time
+
+"""
+        quota = "For every category, try to include at least 5 items."
+        shape = f"Return as JSON with {', '.join(categories[:-1])}, and {categories[-1]} arrays."
+    return f"""You are an expert on current events and a real-time local discovery app for city exploration.
+
+{intro}Find current information near coordinates:
+
+{headings}
+
+For each item:
+- Generate a unique ID (like {examples})
+- Include specific addresses and approximate coordinates if possible
+- Include official website URLs when available
+- Provide citation information ONLY if it's from a different source than the official website
+- {quota}
+
+{shape}
+
+IMPORTANT: For each item, include:
+- id: unique identifier
+- website: official website URL if available (leave empty if not available)
+- citation: object with url, title, and description ONLY if different from official website (leave empty if not available or same as website)
+"""
+
+
+class _PerplexityBase:
+    def __init__(self,
+                 api_key: Optional[str] = None,
+                 connect_timeout: float = CONNECT_TIMEOUT,
+                 read_timeout: float = READ_TIMEOUT,
+                 gzip: bool = GZIP):
+        """Initialize settings and request payloads shared by the sync and async clients."""
         self.api_key = api_key or os.environ.get("PERPLEXITY_API_KEY")
         if not self.api_key:
             raise ValueError("API key is required. Set PERPLEXITY_API_KEY environment variable or pass it directly.")
-        self.base_url = "https://api.perplexity.ai/chat/completions"
-        self.headers = {"Authorization": f"Bearer {self.api_key}"}
+        self.base_url = BASE_URL
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Accept-Encoding": "gzip" if gzip else "identity"
+        }
+        self.timeout = (connect_timeout, read_timeout)
     
-    def basic_query(self, prompt: str, model: str = "sonar-pro") -> str:
-        """Send a basic query to the Perplexity API."""
+    @staticmethod
+    def _content(response: Dict[str, Any]) -> Any:
+        return response["choices"][0]["message"]["content"]
+    
+    @staticmethod
+    def _content_with_citations(response: Dict[str, Any]) -> Dict:
+        # Return both content and citations
+        return {
+            "content": response["choices"][0]["message"]["content"],
+            "citations": response.get("citations", [])
+        }
+    
+    def _basic_query_payload(self, prompt: str, model: str = "sonar-pro") -> Dict[str, Any]:
         payload = {
             "model": model,
             "messages": [
                 {"role": "user", "content": prompt}
             ]
         }
-        
-        response = requests.post(self.base_url, headers=self.headers, json=payload).json()
-        return response["choices"][0]["message"]["content"]
-    
-    def filtered_search(self, 
-                        prompt: str, 
-                        domain_filters: Optional[List[str]] = None,
-                        model: str = "sonar-reasoning-pro") -> str:
-        """Search with domain filters applied."""
+        return payload
+
+    def _filtered_search_payload(self,
+                                 prompt: str,
+                                 domain_filters: Optional[List[str]] = None,
+                                 model: str = "sonar-reasoning-pro") -> Dict[str, Any]:
         payload = {
             "model": model,
             "messages": [
@@ -39,16 +225,13 @@ class PerplexityAPI:
         
         if domain_filters:
             payload["search_domain_filter"] = domain_filters
-            
-        response = requests.post(self.base_url, headers=self.headers, json=payload).json()
-        return response["choices"][0]["message"]["content"]
-    
-    def date_filtered_search(self,
-                            prompt: str,
-                            after_date: Optional[str] = None,
-                            before_date: Optional[str] = None,
-                            model: str = "sonar-pro") -> str:
-        """Search with date filters applied."""
+        return payload
+
+    def _date_filtered_search_payload(self,
+                                      prompt: str,
+                                      after_date: Optional[str] = None,
+                                      before_date: Optional[str] = None,
+                                      model: str = "sonar-pro") -> Dict[str, Any]:
         payload = {
             "model": model,
             "messages": [
@@ -61,17 +244,14 @@ class PerplexityAPI:
             payload["search_after_date_filter"] = after_date
         if before_date:
             payload["search_before_date_filter"] = before_date
-            
-        response = requests.post(self.base_url, headers=self.headers, json=payload).json()
-        return response["choices"][0]["message"]["content"]
-    
-    def location_based_search(self,
-                             prompt: str,
-                             latitude: float,
-                             longitude: float,
-                             country: str,
-                             model: str = "sonar-pro") -> str:
-        """Search with location context."""
+        return payload
+
+    def _location_based_search_payload(self,
+                                       prompt: str,
+                                       latitude: float,
+                                       longitude: float,
+                                       country: str,
+                                       model: str = "sonar-pro") -> Dict[str, Any]:
         payload = {
             "model": model,
             "messages": [
@@ -86,16 +266,13 @@ class PerplexityAPI:
                 }
             }
         }
-        
-        response = requests.post(self.base_url, headers=self.headers, json=payload).json()
-        return response["choices"][0]["message"]["content"]
-    
-    def image_search(self, 
-                    prompt: str, 
-                    return_images: bool = True,
-                    image_domain_filter: Optional[List[str]] = None,
-                    model: str = "sonar") -> str:
-        """Search for images based on the prompt."""
+        return payload
+
+    def _image_search_payload(self,
+                              prompt: str,
+                              return_images: bool = True,
+                              image_domain_filter: Optional[List[str]] = None,
+                              model: str = "sonar") -> Dict[str, Any]:
         payload = {
             "model": model,
             "return_images": return_images,
@@ -106,15 +283,12 @@ class PerplexityAPI:
         
         if image_domain_filter:
             payload["image_domain_filter"] = image_domain_filter
-            
-        response = requests.post(self.base_url, headers=self.headers, json=payload).json()
-        return response["choices"][0]["message"]["content"]
-    
-    def analyze_image(self, 
-                     prompt: str, 
-                     image_url: str,
-                     model: str = "sonar-pro") -> str:
-        """Analyze an image with a text prompt."""
+        return payload
+
+    def _analyze_image_payload(self,
+                               prompt: str,
+                               image_url: str,
+                               model: str = "sonar-pro") -> Dict[str, Any]:
         payload = {
             "model": model,
             "messages": [
@@ -127,15 +301,12 @@ class PerplexityAPI:
                 }
             ]
         }
-        
-        response = requests.post(self.base_url, headers=self.headers, json=payload).json()
-        return response["choices"][0]["message"]["content"]
-    
-    def structured_output(self, 
-                         prompt: str, 
-                         schema: Dict[str, Any],
-                         model: str = "sonar") -> Dict:
-        """Get a structured JSON response based on the provided schema."""
+        return payload
+
+    def _structured_output_payload(self,
+                                   prompt: str,
+                                   schema: Dict[str, Any],
+                                   model: str = "sonar") -> Dict[str, Any]:
         payload = {
             "model": model,
             "messages": [
@@ -147,16 +318,12 @@ class PerplexityAPI:
                 "json_schema": {"schema": schema}
             }
         }
-        
-        response = requests.post(self.base_url, headers=self.headers, json=payload).json()
-        content = response["choices"][0]["message"]["content"]
-        return content
-
-    def geo_structured_output(self, 
-                         prompt: str, 
-                         schema: Dict[str, Any],
-                         model: str = "sonar") -> Dict:
-        """Get a structured JSON response based on the provided schema."""
+        return payload
+
+    def _geo_structured_output_payload(self,
+                                       prompt: str,
+                                       schema: Dict[str, Any],
+                                       model: str = "sonar") -> Dict[str, Any]:
         payload = {
             "model": model,
             "messages": [
@@ -189,51 +356,16 @@ class PerplexityAPI:
                 "json_schema": {"schema": schema}
             }
         }
-        
-        response = requests.post(self.base_url, headers=self.headers, json=payload).json()
-        content = response["choices"][0]["message"]["content"]
-        return content
-
-    def geo_structured_output_with_citations(self, 
-                     prompt: str, 
-                     schema: Dict[str, Any],
-                     model: str = "sonar") -> Dict:
-        """Get a structured JSON response with detailed citations."""
+        return payload
+
+    def _geo_structured_output_with_citations_payload(self,
+                                                      prompt: str,
+                                                      schema: Dict[str, Any],
+                                                      model: str = "sonar") -> Dict[str, Any]:
         payload = {
             "model": model,
             "messages": [
-                {"role": "system", "content": 
-                """
-                You are an expert on current events and a real-time local discovery app for city exploration.
-
-                We're building an app that helps people discover what's happening right around them, whether they're tourists or locals. The key features would be:
-
-                1. Live local events (concerts, meetups, pop-ups happening now)
-                2. Contextual business info (what's open, busy, or recommended nearby)
-                3. Real-time alerts (weather, traffic, safety updates)
-                4. Smart recommendations based on location and time
-                
-                Find current information near coordinates:
-                
-                1. EVENTS: Live events happening today/this week (concerts, festivals, sports, etc.)
-                2. RESTAURANTS: Popular local restaurants and cafes currently open
-                3. ALERTS: Any weather, traffic, or safety alerts for the area
-                
-                For each item:
-                - Generate a unique ID (like "event_001", "restaurant_001", "alert_001")
-                - Include specific addresses and approximate coordinates if possible
-                - Include official website URLs when available
-                - Provide citation information ONLY if it's from a different source than the official website
-                - For every category, try to include at least 5 items
-                
-                Return as JSON with events, restaurants, and alerts arrays.
-                
-                IMPORTANT: For each item, include:
-                - id: unique identifier
-                - website: official website URL if available (leave empty if not available)
-                - citation: object with url, title, and description ONLY if different from official website (leave empty if not available or same as website)
-                """
-                },
+                {"role": "system", "content": local_info_system_prompt(schema)},
                 {"role": "user", "content": prompt}
             ],
             "response_format": {
@@ -243,22 +375,12 @@ class PerplexityAPI:
             "return_citations": True,
             "return_images": False
         }
-        
-        response = requests.post(self.base_url, headers=self.headers, json=payload).json()
-    
-        # Return both content and citations
-        result = {
-            "content": response["choices"][0]["message"]["content"],
-            "citations": response.get("citations", [])
-        }
-        
-        return result
-    
-    def search_with_context_size(self,
-                                prompt: str,
-                                context_size: str = "low",
-                                model: str = "sonar-reasoning-pro") -> str:
-        """Search with specified context size (low, medium, high)."""
+        return payload
+
+    def _search_with_context_size_payload(self,
+                                          prompt: str,
+                                          context_size: str = "low",
+                                          model: str = "sonar-reasoning-pro") -> Dict[str, Any]:
         payload = {
             "model": model,
             "messages": [
@@ -269,17 +391,14 @@ class PerplexityAPI:
                 "search_context_size": context_size
             }
         }
-        
-        response = requests.post(self.base_url, headers=self.headers, json=payload).json()
-        return response["choices"][0]["message"]["content"]
+        return payload
 
-    def get_location_insights(self, 
-                            location_name: str,
-                            location_type: str, 
-                            description: str,
-                            address: str,
-                            model: str = "sonar-reasoning") -> str:
-        """Get personalized insights and recommendations for a location."""
+    def _get_location_insights_payload(self,
+                                       location_name: str,
+                                       location_type: str,
+                                       description: str,
+                                       address: str,
+                                       model: str = "sonar-reasoning") -> Dict[str, Any]:
         payload = {
             "model": model,
             "messages": [
@@ -312,9 +431,126 @@ class PerplexityAPI:
             ],
             "return_citations": True
         }
-        
-        response = requests.post(self.base_url, headers=self.headers, json=payload).json()
-        return response["choices"][0]["message"]["content"]
+        return payload
+
+class PerplexityAPI(_PerplexityBase):
+    def __init__(self, *args, **kwargs):
+        """Initialize the Perplexity API client."""
+        super().__init__(*args, **kwargs)
+        self.session = get_session()
+    
+    def _post(self,
+              payload: Dict[str, Any],
+              timeout: Optional[Tuple[float, float]] = None,
+              method: str = "chat") -> Dict[str, Any]:
+        """Send a chat completion request over the shared pooled session."""
+        with track_upstream(method, payload.get("model", "")) as call:
+            response = self.session.post(self.base_url, headers=self.headers, json=payload, timeout=timeout or self.timeout)
+            call.outcome = str(response.status_code)
+            call.sizes(len(response.request.body or b""), len(response.content))
+            response.raise_for_status()
+            return response.json()
+    
+    def basic_query(self, prompt: str, model: str = "sonar-pro", timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Send a basic query to the Perplexity API."""
+        payload = self._basic_query_payload(prompt, model)
+        return self._content(self._post(payload, timeout, method="basic_query"))
+
+    def filtered_search(self,
+                        prompt: str,
+                        domain_filters: Optional[List[str]] = None,
+                        model: str = "sonar-reasoning-pro",
+                        timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Search with domain filters applied."""
+        payload = self._filtered_search_payload(prompt, domain_filters, model)
+        return self._content(self._post(payload, timeout, method="filtered_search"))
+
+    def date_filtered_search(self,
+                             prompt: str,
+                             after_date: Optional[str] = None,
+                             before_date: Optional[str] = None,
+                             model: str = "sonar-pro",
+                             timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Search with date filters applied."""
+        payload = self._date_filtered_search_payload(prompt, after_date, before_date, model)
+        return self._content(self._post(payload, timeout, method="date_filtered_search"))
+
+    def location_based_search(self,
+                              prompt: str,
+                              latitude: float,
+                              longitude: float,
+                              country: str,
+                              model: str = "sonar-pro",
+                              timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Search with location context."""
+        payload = self._location_based_search_payload(prompt, latitude, longitude, country, model)
+        return self._content(self._post(payload, timeout, method="location_based_search"))
+
+    def image_search(self,
+                     prompt: str,
+                     return_images: bool = True,
+                     image_domain_filter: Optional[List[str]] = None,
+                     model: str = "sonar",
+                     timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Search for images based on the prompt."""
+        payload = self._image_search_payload(prompt, return_images, image_domain_filter, model)
+        return self._content(self._post(payload, timeout, method="image_search"))
+
+    def analyze_image(self,
+                      prompt: str,
+                      image_url: str,
+                      model: str = "sonar-pro",
+                      timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Analyze an image with a text prompt."""
+        payload = self._analyze_image_payload(prompt, image_url, model)
+        return self._content(self._post(payload, timeout, method="analyze_image"))
+
+    def structured_output(self,
+                          prompt: str,
+                          schema: Dict[str, Any],
+                          model: str = "sonar",
+                          timeout: Optional[Tuple[float, float]] = None) -> Dict:
+        """Get a structured JSON response based on the provided schema."""
+        payload = self._structured_output_payload(prompt, schema, model)
+        return self._content(self._post(payload, timeout, method="structured_output"))
+
+    def geo_structured_output(self,
+                              prompt: str,
+                              schema: Dict[str, Any],
+                              model: str = "sonar",
+                              timeout: Optional[Tuple[float, float]] = None) -> Dict:
+        """Get a structured JSON response based on the provided schema."""
+        payload = self._geo_structured_output_payload(prompt, schema, model)
+        return self._content(self._post(payload, timeout, method="geo_structured_output"))
+
+    def geo_structured_output_with_citations(self,
+                                             prompt: str,
+                                             schema: Dict[str, Any],
+                                             model: str = "sonar",
+                                             timeout: Optional[Tuple[float, float]] = None) -> Dict:
+        """Get a structured JSON response with detailed citations."""
+        payload = self._geo_structured_output_with_citations_payload(prompt, schema, model)
+        return self._content_with_citations(self._post(payload, timeout, method="geo_structured_output_with_citations"))
+
+    def search_with_context_size(self,
+                                 prompt: str,
+                                 context_size: str = "low",
+                                 model: str = "sonar-reasoning-pro",
+                                 timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Search with specified context size (low, medium, high)."""
+        payload = self._search_with_context_size_payload(prompt, context_size, model)
+        return self._content(self._post(payload, timeout, method="search_with_context_size"))
+
+    def get_location_insights(self,
+                              location_name: str,
+                              location_type: str,
+                              description: str,
+                              address: str,
+                              model: str = "sonar-reasoning",
+                              timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Get personalized insights and recommendations for a location."""
+        payload = self._get_location_insights_payload(location_name, location_type, description, address, model)
+        return self._content(self._post(payload, timeout, method="get_location_insights"))
 
     # Example usage
     def example_usage():
@@ -380,4 +616,196 @@ class PerplexityAPI:
             "Explain quantum computing in simple terms.",
             context_size="high"
         )
-        print("Context Size Search Result:", result)
\ No newline at end of file
+        print("Context Size Search Result:", result)
+
+
+class AsyncPerplexityAPI(_PerplexityBase):
+    def __init__(self,
+                 *args,
+                 hedger: Optional[Hedger] = None,
+                 limiter: Optional[RateLimiter] = None,
+                 breakers: Optional[CircuitBreakers] = None,
+                 **kwargs):
+        """Initialize the asyncio Perplexity API client, optionally hedging slow structured calls."""
+        super().__init__(*args, **kwargs)
+        self.client = get_async_client()
+        self.hedger = hedger
+        self.limiter = limiter or get_rate_limiter()
+        self.breakers = breakers or get_circuit_breakers()
+    
+    async def _post(self,
+                    payload: Dict[str, Any],
+                    timeout: Optional[Tuple[float, float]] = None,
+                    hedge: bool = False,
+                    method: str = "chat") -> Dict[str, Any]:
+        """Send a chat completion request, hedged if requested and a hedger is configured.
+
+        The limiter slot is taken before the hedge clock starts, so time spent queueing neither
+        triggers a hedge nor counts towards the hedger's latency percentiles. A hedge is only sent
+        if a slot is free right away.
+        """
+        lane = upstream_lane.get()
+        async with self.limiter.slot(lane):
+            if hedge and self.hedger is not None:
+                return await self.hedger.run(lambda: self._send(payload, timeout, method),
+                                             hedge_slot=lambda: self._try_slot(lane))
+            return await self._send(payload, timeout, method)
+    
+    def _try_slot(self, lane: str) -> Optional[Callable[[], None]]:
+        if not self.limiter.try_acquire(lane):
+            return None
+        return lambda: self.limiter.release(lane)
+    
+    async def _send(self,
+                    payload: Dict[str, Any],
+                    timeout: Optional[Tuple[float, float]] = None,
+                    method: str = "chat") -> Dict[str, Any]:
+        """Send one admitted chat completion request over the shared pooled async client."""
+        connect_timeout, read_timeout = timeout or self.timeout
+        with self.breakers.get(payload.get("model", "")).call():
+            with track_upstream(method, payload.get("model", "")) as call:
+                response = await self.client.post(self.base_url, headers=self.headers, json=payload,
+                                                  timeout=httpx.Timeout(read_timeout, connect=connect_timeout))
+                call.outcome = str(response.status_code)
+                call.sizes(len(response.request.content), len(response.content))
+                if response.status_code == 429:
+                    self.limiter.throttle(response.headers.get("retry-after"))
+                response.raise_for_status()
+                return response.json()
+    
+    async def basic_query(self, prompt: str, model: str = "sonar-pro", timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Send a basic query to the Perplexity API."""
+        payload = self._basic_query_payload(prompt, model)
+        return self._content(await self._post(payload, timeout, method="basic_query"))
+
+    async def filtered_search(self,
+                              prompt: str,
+                              domain_filters: Optional[List[str]] = None,
+                              model: str = "sonar-reasoning-pro",
+                              timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Search with domain filters applied."""
+        payload = self._filtered_search_payload(prompt, domain_filters, model)
+        return self._content(await self._post(payload, timeout, method="filtered_search"))
+
+    async def date_filtered_search(self,
+                                   prompt: str,
+                                   after_date: Optional[str] = None,
+                                   before_date: Optional[str] = None,
+                                   model: str = "sonar-pro",
+                                   timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Search with date filters applied."""
+        payload = self._date_filtered_search_payload(prompt, after_date, before_date, model)
+        return self._content(await self._post(payload, timeout, method="date_filtered_search"))
+
+    async def location_based_search(self,
+                                    prompt: str,
+                                    latitude: float,
+                                    longitude: float,
+                                    country: str,
+                                    model: str = "sonar-pro",
+                                    timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Search with location context."""
+        payload = self._location_based_search_payload(prompt, latitude, longitude, country, model)
+        return self._content(await self._post(payload, timeout, method="location_based_search"))
+
+    async def image_search(self,
+                           prompt: str,
+                           return_images: bool = True,
+                           image_domain_filter: Optional[List[str]] = None,
+                           model: str = "sonar",
+                           timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Search for images based on the prompt."""
+        payload = self._image_search_payload(prompt, return_images, image_domain_filter, model)
+        return self._content(await self._post(payload, timeout, method="image_search"))
+
+    async def analyze_image(self,
+                            prompt: str,
+                            image_url: str,
+                            model: str = "sonar-pro",
+                            timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Analyze an image with a text prompt."""
+        payload = self._analyze_image_payload(prompt, image_url, model)
+        return self._content(await self._post(payload, timeout, method="analyze_image"))
+
+    async def structured_output(self,
+                                prompt: str,
+                                schema: Dict[str, Any],
+                                model: str = "sonar",
+                                timeout: Optional[Tuple[float, float]] = None) -> Dict:
+        """Get a structured JSON response based on the provided schema."""
+        payload = self._structured_output_payload(prompt, schema, model)
+        return self._content(await self._post(payload, timeout, method="structured_output"))
+
+    async def geo_structured_output(self,
+                                    prompt: str,
+                                    schema: Dict[str, Any],
+                                    model: str = "sonar",
+                                    timeout: Optional[Tuple[float, float]] = None) -> Dict:
+        """Get a structured JSON response based on the provided schema."""
+        payload = self._geo_structured_output_payload(prompt, schema, model)
+        return self._content(await self._post(payload, timeout, method="geo_structured_output"))
+
+    async def geo_structured_output_with_citations(self,
+                                                   prompt: str,
+                                                   schema: Dict[str, Any],
+                                                   model: str = "sonar",
+                                                   timeout: Optional[Tuple[float, float]] = None) -> Dict:
+        """Get a structured JSON response with detailed citations."""
+        payload = self._geo_structured_output_with_citations_payload(prompt, schema, model)
+        return self._content_with_citations(await self._post(payload, timeout, hedge=True, method="geo_structured_output_with_citations"))
+
+    async def stream_geo_structured_output_with_citations(self,
+                                                          prompt: str,
+                                                          schema: Dict[str, Any],
+                                                          model: str = "sonar",
+                                                          timeout: Optional[Tuple[float, float]] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream a structured response, yielding ("content", text delta) and finally ("citations", list)."""
+        payload = {**self._geo_structured_output_with_citations_payload(prompt, schema, model), "stream": True}
+        connect_timeout, read_timeout = timeout or self.timeout
+        citations = []
+        with self.breakers.get(model).call() as guard:
+            async with self.limiter.slot():
+                guard.sent()
+                with track_upstream("stream_geo_structured_output_with_citations", model) as call:
+                    async with self.client.stream("POST", self.base_url, headers=self.headers, json=payload,
+                                                  timeout=httpx.Timeout(read_timeout, connect=connect_timeout)) as response:
+                        call.outcome = str(response.status_code)
+                        if response.status_code == 429:
+                            self.limiter.throttle(response.headers.get("retry-after"))
+                        response.raise_for_status()
+                        received = 0
+                        async for line in response.aiter_lines():
+                            received += len(line) + 1
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            chunk = json.loads(data)
+                            citations = chunk.get("citations") or citations
+                            choices = chunk.get("choices") or [{}]
+                            delta = choices[0].get("delta", {}).get("content")
+                            if delta:
+                                yield "content", delta
+                        call.sizes(len(response.request.content), received)
+        yield "citations", citations
+
+    async def search_with_context_size(self,
+                                       prompt: str,
+                                       context_size: str = "low",
+                                       model: str = "sonar-reasoning-pro",
+                                       timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Search with specified context size (low, medium, high)."""
+        payload = self._search_with_context_size_payload(prompt, context_size, model)
+        return self._content(await self._post(payload, timeout, method="search_with_context_size"))
+
+    async def get_location_insights(self,
+                                    location_name: str,
+                                    location_type: str,
+                                    description: str,
+                                    address: str,
+                                    model: str = "sonar-reasoning",
+                                    timeout: Optional[Tuple[float, float]] = None) -> str:
+        """Get personalized insights and recommendations for a location."""
+        payload = self._get_location_insights_payload(location_name, location_type, description, address, model)
+        return self._content(await self._post(payload, timeout, method="get_location_insights"))
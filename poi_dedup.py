@@ -0,0 +1,249 @@
+# De-duplication of near-identical POIs across categories and responses
+import re
+import math
+from functools import lru_cache
+from itertools import combinations
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from poi_index import EARTH_RADIUS_M, METERS_PER_DEGREE, haversine_m, poi_position
+
+CATEGORY_ORDER = ("events", "restaurants", "alerts")
+STOPWORDS = {"the", "a", "an", "and", "at", "of", "in", "on"}
+# Words a venue's name gains or loses between sources ("Starbucks" and "Starbucks Coffee")
+VENUE_WORDS = {
+    "bakery", "bar", "barbecue", "bbq", "bistro", "brewery", "brewing", "cafe", "café", "cantina", "co",
+    "coffee", "company", "deli", "diner", "eatery", "grill", "kitchen", "pizza", "pizzeria", "pub",
+    "restaurant", "shop", "taqueria", "tavern"
+}
+
+PUNCTUATION = re.compile(r"[^\w\s]")
+# Separates names while a batch is normalized as one string; it is punctuation, so no name keeps it
+_SEPARATOR = "\x00"
+_PUNCTUATION_OR_SEPARATOR = re.compile(r"[^\w\s\x00]")
+
+# The same names come back in every response for an area, and each response is de-duplicated more than once
+_NAME_CACHE: Dict[str, str] = {}
+_NAME_CACHE_SIZE = 16384
+
+
+def normalize_name(name: Any) -> str:
+    """Lowercase, strip punctuation and filler words so spelling variants compare equal."""
+    return normalize_names([name])[0]
+
+
+def normalize_names(names: List[Any]) -> List[str]:
+    """normalize_name for a batch; names not seen before are normalized together in one pass."""
+    raw = [str(name or "") for name in names]
+    normalized = [_NAME_CACHE.get(name) for name in raw]
+    missing = [name for name, value in zip(raw, normalized) if value is None]
+    if not missing:
+        return normalized
+    fresh = dict(zip(missing, _normalize_batch(missing)))
+    if len(_NAME_CACHE) + len(fresh) > _NAME_CACHE_SIZE:
+        _NAME_CACHE.clear()
+    _NAME_CACHE.update(fresh)
+    return [fresh[name] if value is None else value for name, value in zip(raw, normalized)]
+
+
+def _normalize_batch(names: List[str]) -> List[str]:
+    """Normalize names as a few passes over one joined string instead of a loop per name.
+
+    "&" becomes a space rather than "and", which is a stopword anyway.
+    """
+    text = _SEPARATOR.join(names)
+    if text.count(_SEPARATOR) != len(names) - 1:
+        text = _SEPARATOR.join(name.replace(_SEPARATOR, " ") for name in names)
+    text = text.lower().replace("'", "").replace("\u2019", "")
+    words = _PUNCTUATION_OR_SEPARATOR.sub(" ", text).replace(_SEPARATOR, f" {_SEPARATOR} ").split()
+    return [name.strip() for name in " ".join([w for w in words if w not in STOPWORDS]).split(_SEPARATOR)]
+
+
+@lru_cache(maxsize=16384)
+def _tokens(name: str) -> Tuple[frozenset, frozenset]:
+    """(words, padded character trigrams) of a normalized name."""
+    padded = f"  {name} "
+    return frozenset(name.split()), frozenset(map("".join, zip(padded, padded[1:], padded[2:])))
+
+
+# Candidate pairs repeat too, since nearby venues keep their names across responses
+@lru_cache(maxsize=65536)
+def name_similarity(a: str, b: str) -> float:
+    """The larger of word and trigram Jaccard similarity between two normalized names.
+
+    Words catch reordering, trigrams catch spelling variants. A name that only adds words to
+    another (e.g. "Road closure" and "Road closure on Main") scores by how much it adds, not 1,
+    unless every added word is in VENUE_WORDS ("Starbucks" and "Starbucks Coffee").
+    """
+    if not a or not b:
+        return 0.0
+    words_a, trigrams_a = _tokens(a)
+    words_b, trigrams_b = _tokens(b)
+    shorter, longer = (words_a, words_b) if len(words_a) <= len(words_b) else (words_b, words_a)
+    if shorter < longer and longer - shorter <= VENUE_WORDS and shorter - VENUE_WORDS:
+        return 1.0
+    return max(len(words_a & words_b) / len(words_a | words_b),
+               len(trigrams_a & trigrams_b) / len(trigrams_a | trigrams_b))
+
+
+def haversine(lat1: np.ndarray, lng1: np.ndarray, lat2: np.ndarray, lng2: np.ndarray) -> np.ndarray:
+    """Element-wise great-circle distances in meters."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = np.radians(lng2 - lng1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def positions(items: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """(lat, lng) arrays for items, NaN where poi_position would return None.
+
+    Converts every coordinate in one array call, and falls back to poi_position per item
+    only when some value is not a number or numeric string.
+    """
+    try:
+        lat = np.array([item.get("latitude") for item in items], dtype=float)
+        lng = np.array([item.get("longitude") for item in items], dtype=float)
+    except (TypeError, ValueError):
+        found = [poi_position(item) or (np.nan, np.nan) for item in items]
+        lat, lng = np.array([position[0] for position in found]), np.array([position[1] for position in found])
+    with np.errstate(invalid="ignore"):
+        invalid = ~((np.abs(lat) <= 90) & (np.abs(lng) <= 180)) | ((lat == 0) & (lng == 0))
+    lat[invalid] = lng[invalid] = np.nan
+    return lat, lng
+
+
+def close_pairs(lat: np.ndarray, lng: np.ndarray, radius_m: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return (i, j, meters) for every pair i < j within radius_m of each other.
+
+    Items are swept in latitude order so only pairs inside the latitude window are generated,
+    then a longitude box and the exact haversine filter them. Items with NaN coordinates never match.
+    """
+    empty = np.empty(0, dtype=np.intp)
+    placed = np.flatnonzero(~(np.isnan(lat) | np.isnan(lng)))
+    if len(placed) < 2:
+        return empty, empty, np.empty(0)
+    order = placed[np.argsort(lat[placed], kind="stable")]
+    sorted_lat, sorted_lng = lat[order], lng[order]
+
+    # For each item, the run of later items whose latitude is within the window
+    start = np.arange(1, len(order) + 1)
+    counts = np.searchsorted(sorted_lat, sorted_lat + radius_m / METERS_PER_DEGREE, side="right") - start
+    total = int(counts.sum())
+    if total == 0:
+        return empty, empty, np.empty(0)
+    a = np.repeat(np.arange(len(order)), counts)
+    b = np.repeat(start, counts) + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    max_lat = min(float(np.max(np.abs(sorted_lat))), 89.0)
+    lng_span = radius_m / (METERS_PER_DEGREE * max(np.cos(np.radians(max_lat)), 0.01))
+    box = np.abs(sorted_lng[a] - sorted_lng[b]) <= lng_span
+    a, b = a[box], b[box]
+    meters = haversine(sorted_lat[a], sorted_lng[a], sorted_lat[b], sorted_lng[b])
+    keep = meters <= radius_m
+    i, j = order[a[keep]], order[b[keep]]
+    return np.minimum(i, j), np.maximum(i, j), meters[keep]
+
+
+def _merge(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Keep the first item, fill its empty fields from the others and collect every citation."""
+    merged = dict(items[0])
+    for item in items[1:]:
+        for field, value in item.items():
+            if merged.get(field) in (None, "", [], {}) and value not in (None, "", [], {}):
+                merged[field] = value
+    citations = []
+    for item in items:
+        citation = item.get("citation")
+        if citation and citation not in citations:
+            citations.append(citation)
+        for citation in item.get("citations", []):
+            if citation not in citations:
+                citations.append(citation)
+    if len(citations) > 1:
+        merged["citations"] = citations
+    merged["merged_ids"] = [item.get("id") for item in items if item.get("id")]
+    return merged
+
+
+def dedupe_pois(content: Dict[str, Any],
+                near_m: float = 75,
+                same_name_m: float = 500,
+                min_similarity: float = 0.75) -> Dict[str, Any]:
+    """Cluster near-duplicate POIs across categories and merge each cluster into one item.
+
+    Two items are duplicates if they are within `near_m` meters and their names are similar,
+    or if their normalized names are identical and they are within `same_name_m` meters
+    (or either has no coordinates). Each cluster stays in the category of its first item.
+    Only pairs that pass the spatial sweep or share a name are compared, so the cost stays
+    close to linear in the number of items.
+    """
+    categories = [c for c in CATEGORY_ORDER if isinstance(content.get(c), list)]
+    categories += [c for c in content if isinstance(content.get(c), list) and c not in categories]
+    by_category = {category: [item for item in content[category] if isinstance(item, dict)] for category in categories}
+    items = [item for category in categories for item in by_category[category]]
+    n = len(items)
+    if n < 2:
+        return content
+
+    names = normalize_names([item.get("name") or item.get("title") for item in items])
+    lat, lng = positions(items)
+
+    parent = list(range(n))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Items in a cluster of two or more; every other item is its own root
+    merged = set()
+
+    def union(i: int, j: int) -> None:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+            merged.update((i, j))
+
+    # Spatially close pairs with similar names
+    near_i, near_j, _ = close_pairs(lat, lng, near_m)
+    for i, j in zip(near_i.tolist(), near_j.tolist()):
+        if names[i] == names[j] or name_similarity(names[i], names[j]) >= min_similarity:
+            union(i, j)
+
+    # Identical names further apart, or where either side has no coordinates. Most names are
+    # unique, so only the items whose name already appeared earlier are grouped in Python.
+    first = dict(zip(reversed(names), range(n - 1, -1, -1)))
+    groups: Dict[str, List[int]] = {}
+    if len(first) < n:
+        for index, name in enumerate(names):
+            if name and first[name] != index:
+                groups.setdefault(name, [first[name]]).append(index)
+    if groups:
+        # Groups are tiny, so plain scalar math beats array setup here
+        lats, lngs = lat.tolist(), lng.tolist()
+        for members in groups.values():
+            for i, j in combinations(members, 2):
+                if find(i) == find(j):
+                    continue
+                if math.isnan(lats[i]) or math.isnan(lats[j]) or haversine_m(lats[i], lngs[i], lats[j], lngs[j]) <= same_name_m:
+                    union(i, j)
+
+    if not merged:
+        return content
+    clusters: Dict[int, List[int]] = {}
+    for i in sorted(merged):
+        clusters.setdefault(find(i), []).append(i)
+    # A cluster's root is its lowest index, so it replaces its first item in that item's category
+    replaced = {root: _merge([items[i] for i in members]) for root, members in clusters.items()}
+    dropped = merged.difference(replaced)
+
+    deduped = dict(content)
+    start = 0
+    for category in categories:
+        end = start + len(by_category[category])
+        deduped[category] = [replaced.get(i, items[i]) for i in range(start, end) if i not in dropped]
+        start = end
+    return deduped
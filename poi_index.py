@@ -0,0 +1,117 @@
+# In-memory spatial index of recently returned POIs
+import math
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE = 111320.0
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def poi_position(item: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """Return (lat, lng) for an item, or None if it has no usable coordinates."""
+    try:
+        lat, lng = float(item["latitude"]), float(item["longitude"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or (lat == 0 and lng == 0):
+        return None
+    return lat, lng
+
+
+def poi_name(item: Dict[str, Any]) -> str:
+    return " ".join(str(item.get("name") or item.get("title") or "").lower().split())
+
+
+class PoiIndex:
+    def __init__(self, cell_size: float = 0.01, max_items: int = 50000):
+        """Index POIs on a fixed lat/lng grid (0.01 degrees is roughly 1.1km) per category."""
+        self.cell_size = cell_size
+        self.max_items = max_items
+        # category -> cell -> item key -> (seen_at, lat, lng, item)
+        self._grid: Dict[str, Dict[Tuple[int, int], Dict[str, Tuple[float, float, float, Dict]]]] = {}
+        self._order: "OrderedDict[str, Tuple[str, Tuple[int, int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_size), math.floor(lng / self.cell_size)
+
+    def add(self, content: Dict[str, Iterable[Dict[str, Any]]], seen_at: Optional[float] = None) -> int:
+        """Index every positioned item of a {category: [items]} response; returns how many were added."""
+        seen_at = seen_at or time.time()
+        added = 0
+        with self._lock:
+            for category, items in content.items():
+                if not isinstance(items, list):
+                    continue
+                for item in items:
+                    position = poi_position(item) if isinstance(item, dict) else None
+                    if position is None:
+                        continue
+                    lat, lng = position
+                    cell = self._cell(lat, lng)
+                    key = f"{category}|{poi_name(item)}|{round(lat, 4)}|{round(lng, 4)}"
+                    if key in self._order:
+                        old_category, old_cell = self._order.pop(key)
+                        self._grid[old_category][old_cell].pop(key, None)
+                    self._grid.setdefault(category, {}).setdefault(cell, {})[key] = (seen_at, lat, lng, item)
+                    self._order[key] = (category, cell)
+                    added += 1
+            while len(self._order) > self.max_items:
+                key, (category, cell) = self._order.popitem(last=False)
+                bucket = self._grid[category][cell]
+                bucket.pop(key, None)
+                if not bucket:
+                    del self._grid[category][cell]
+        return added
+
+    def nearby(self,
+               lat: float,
+               lng: float,
+               radius_m: float,
+               categories: Optional[Iterable[str]] = None,
+               max_age: Optional[float] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Return {category: [items]} within radius_m, nearest first, each tagged with distance and age."""
+        now = time.time()
+        lat_span = radius_m / METERS_PER_DEGREE
+        lng_span = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        min_cell = self._cell(lat - lat_span, lng - lng_span)
+        max_cell = self._cell(lat + lat_span, lng + lng_span)
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        with self._lock:
+            for category in categories or list(self._grid):
+                cells = self._grid.get(category, {})
+                found = []
+                for x in range(min_cell[0], max_cell[0] + 1):
+                    for y in range(min_cell[1], max_cell[1] + 1):
+                        for seen_at, item_lat, item_lng, item in cells.get((x, y), {}).values():
+                            age = now - seen_at
+                            if max_age is not None and age > max_age:
+                                continue
+                            distance = haversine_m(lat, lng, item_lat, item_lng)
+                            if distance <= radius_m:
+                                found.append((distance, age, item))
+                found.sort(key=lambda entry: entry[0])
+                results[category] = [
+                    {**item, "distance_m": round(distance), "age": round(age)}
+                    for distance, age, item in found
+                ]
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "items": len(self._order),
+                "max_items": self.max_items,
+                "cells": sum(len(cells) for cells in self._grid.values())
+            }
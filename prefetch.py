@@ -0,0 +1,116 @@
+# Low-priority background prefetch of location insights for freshly returned pins
+import time
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+CATEGORY_TYPES = {"events": "event", "restaurants": "restaurant", "alerts": "alert"}
+
+
+def insight_requests(data: Dict[str, Any], top_n: int) -> List[Dict[str, str]]:
+    """Pick the first `top_n` POIs, alternating categories, as the params the modal sends to /api/location-insights."""
+    queues = [(CATEGORY_TYPES[category], list(data.get(category) or [])) for category in CATEGORY_TYPES]
+    picked = []
+    while len(picked) < top_n and any(items for _, items in queues):
+        for location_type, items in queues:
+            if items and len(picked) < top_n:
+                item = items.pop(0)
+                if not isinstance(item, dict) or not (item.get("name") or item.get("title")):
+                    continue
+                picked.append({
+                    "name": item.get("name") or item.get("title"),
+                    "type": location_type,
+                    "description": item.get("description") or "",
+                    "address": item.get("address") or ""
+                })
+    return picked
+
+
+class Prefetcher:
+    def __init__(self,
+                 fetch: Callable[[Dict[str, str]], Awaitable[Any]],
+                 foreground_busy: Callable[[], bool],
+                 workers: int = 2,
+                 max_queue: int = 200,
+                 max_age: float = 120):
+        """Run `fetch` for queued jobs on a fixed pool of workers, which is also the cap on concurrent prefetches.
+
+        Workers only start a job while `foreground_busy()` is false. Jobs are dropped when their
+        session has moved to another cell since they were queued, or when older than `max_age`.
+        """
+        self.fetch = fetch
+        self.foreground_busy = foreground_busy
+        self.workers = workers
+        self.max_age = max_age
+        self._queue: Deque[tuple] = deque(maxlen=max_queue)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        # session -> (cell, generation); jobs carry the generation they were queued under
+        self._sessions: Dict[str, tuple] = {}
+        self.running = 0
+        self.queued = 0
+        self.completed = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def submit(self, session_id: str, cell: str, jobs: List[Dict[str, str]]) -> None:
+        """Queue jobs for a session; a new cell invalidates everything it queued before."""
+        current = self._sessions.get(session_id)
+        generation = current[1] if current and current[0] == cell else (current[1] + 1 if current else 0)
+        self._sessions[session_id] = (cell, generation)
+        if len(self._sessions) > 10000:
+            self._sessions.pop(next(iter(self._sessions)))
+        now = time.time()
+        for job in jobs:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append((now, session_id, generation, job))
+            self.queued += 1
+        self._start()
+        self._wakeup.set()
+
+    def _start(self) -> None:
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+
+    def _stale(self, queued_at: float, session_id: str, generation: int) -> bool:
+        session = self._sessions.get(session_id)
+        return session is None or session[1] != generation or time.time() - queued_at > self.max_age
+
+    async def _work(self) -> None:
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            # Yield to foreground requests; recheck staleness after waiting
+            while self.foreground_busy():
+                await asyncio.sleep(0.25)
+            if not self._queue:
+                continue
+            queued_at, session_id, generation, job = self._queue.popleft()
+            if self._stale(queued_at, session_id, generation):
+                self.dropped += 1
+                continue
+            self.running += 1
+            try:
+                await self.fetch(job)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Prefetch failed: {e!r}")
+            finally:
+                self.running -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "queue": len(self._queue),
+            "running": self.running,
+            "queued": self.queued,
+            "completed": self.completed,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
@@ -0,0 +1,181 @@
+# Client-side concurrency and requests-per-minute limits for upstream calls, with priority lanes
+import time
+import asyncio
+import contextvars
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from metrics import UPSTREAM_QUEUE_WAIT_SECONDS, UPSTREAM_QUEUED, UPSTREAM_THROTTLED
+
+# Lanes in priority order: map loads and searches, on-demand suggestions and insights, prefetches and refreshes
+INTERACTIVE = "interactive"
+STANDARD = "standard"
+BACKGROUND = "background"
+LANES = (INTERACTIVE, STANDARD, BACKGROUND)
+
+upstream_lane: contextvars.ContextVar = contextvars.ContextVar("upstream_lane", default=STANDARD)
+
+
+def in_lane(lane: str, fn: Callable[[], Awaitable[Any]]) -> Callable[[], Awaitable[Any]]:
+    """Wrap fn so the upstream calls it makes queue in `lane`; meant for functions run as their own task."""
+    async def run():
+        upstream_lane.set(lane)
+        return await fn()
+    return run
+
+
+class _Slot:
+    def __init__(self, limiter: "RateLimiter", lane: str):
+        self.limiter = limiter
+        self.lane = lane
+
+    async def __aenter__(self) -> "_Slot":
+        await self.limiter.acquire(self.lane)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.limiter.release(self.lane)
+
+
+class RateLimiter:
+    def __init__(self,
+                 max_concurrency: int = 16,
+                 rpm: float = 0,
+                 burst: float = 10,
+                 reserved: int = 4,
+                 max_pause: float = 30):
+        """Admit at most `max_concurrency` calls at once and `rpm` calls per minute (0 means no limit).
+
+        The rate is a token bucket holding up to `burst` calls. Waiting calls are admitted by lane
+        priority, first come first served within a lane, and `reserved` slots are kept for the
+        interactive lane. A 429 from the upstream empties the bucket and pauses admission for its
+        Retry-After (capped at `max_pause` seconds), so retries queue here instead of piling on.
+        """
+        self.max_concurrency = max_concurrency
+        self.rate = rpm / 60
+        self.burst = max(burst, 1)
+        self.reserved = min(reserved, max_concurrency - 1)
+        self.max_pause = max_pause
+        self._tokens = self.burst
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+        self._active: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.admitted = 0
+        self.queued = 0
+        self.throttled = 0
+
+    def slot(self, lane: Optional[str] = None) -> _Slot:
+        """Async context manager holding one admission for the duration of a call."""
+        return _Slot(self, lane or upstream_lane.get())
+
+    def _refill(self, now: float) -> None:
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _has_room(self, lane: str) -> bool:
+        active = sum(self._active.values())
+        limit = self.max_concurrency if lane == INTERACTIVE else self.max_concurrency - self.reserved
+        return active < limit
+
+    def _delay(self, now: float) -> float:
+        """Seconds until the rate allows another call."""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.rate and self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        return 0.0
+
+    def _admit(self, lane: str) -> None:
+        if self.rate:
+            self._tokens -= 1
+        self._active[lane] += 1
+        self.admitted += 1
+
+    def _dispatch(self) -> None:
+        """Admit waiters in priority order while slots and tokens last; otherwise wake up when a token is due."""
+        now = time.monotonic()
+        self._refill(now)
+        for lane in LANES:
+            waiters = self._waiters[lane]
+            while waiters and self._has_room(lane):
+                if waiters[0].done():
+                    waiters.popleft()
+                    continue
+                delay = self._delay(now)
+                if delay > 0:
+                    if self._timer is None:
+                        self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+                    return
+                self._admit(lane)
+                waiters.popleft().set_result(None)
+                UPSTREAM_QUEUED.dec(lane)
+
+    def _wake(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    async def acquire(self, lane: str) -> None:
+        started = time.monotonic()
+        self._refill(started)
+        if not any(self._waiters.values()) and self._has_room(lane) and self._delay(started) == 0:
+            self._admit(lane)
+            UPSTREAM_QUEUE_WAIT_SECONDS.observe(0.0, lane)
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(waiter)
+        self.queued += 1
+        UPSTREAM_QUEUED.inc(lane)
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Admitted just as the caller gave up; hand the slot on
+                self.release(lane)
+            else:
+                UPSTREAM_QUEUED.dec(lane)
+            raise
+        UPSTREAM_QUEUE_WAIT_SECONDS.observe(time.monotonic() - started, lane)
+
+    def try_acquire(self, lane: str) -> bool:
+        """Admit a call only if it would not have to wait; the caller must release(lane) after it."""
+        now = time.monotonic()
+        self._refill(now)
+        if any(self._waiters.values()) or not self._has_room(lane) or self._delay(now) > 0:
+            return False
+        self._admit(lane)
+        return True
+
+    def release(self, lane: str) -> None:
+        self._active[lane] -= 1
+        self._dispatch()
+
+    def pending(self, lanes=LANES) -> int:
+        """Calls admitted or waiting in the given lanes."""
+        return sum(self._active[lane] + len(self._waiters[lane]) for lane in lanes)
+
+    def throttle(self, retry_after: Optional[str]) -> None:
+        """Back off after a 429: drop banked tokens and pause admission for Retry-After seconds (default 1)."""
+        try:
+            pause = float(retry_after)
+        except (TypeError, ValueError):
+            pause = 1.0
+        self._tokens = 0.0
+        self._paused_until = max(self._paused_until, time.monotonic() + min(max(pause, 0), self.max_pause))
+        self.throttled += 1
+        UPSTREAM_THROTTLED.inc()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "rpm": round(self.rate * 60, 2),
+            "active": dict(self._active),
+            "waiting": {lane: len(waiters) for lane, waiters in self._waiters.items()},
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "throttled": self.throttled,
+            "tokens": round(self._tokens, 2) if self.rate else None
+        }
@@ -0,0 +1,143 @@
+# Deadline-bounded retry engine for upstream calls
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+import httpx
+
+from metrics import RETRY_ATTEMPTS, EMPTY_RESULT_RETRIES
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class RetryableError(Exception):
+    """A failure worth another attempt."""
+
+
+class FatalError(Exception):
+    """A failure that retrying cannot fix."""
+
+
+class EmptyResultError(RetryableError):
+    """The upstream answered, but with nothing useful; keeps the result in case it is the last one."""
+
+    def __init__(self, result: Any, message: str = "Got empty arrays"):
+        super().__init__(message)
+        self.result = result
+
+
+class RetryPolicy:
+    def __init__(self,
+                 max_attempts: int = int(os.environ.get("RETRY_MAX_ATTEMPTS", 10)),
+                 deadline: float = float(os.environ.get("RETRY_DEADLINE", 45)),
+                 base_delay: float = float(os.environ.get("RETRY_BASE_DELAY", 0.25)),
+                 max_delay: float = float(os.environ.get("RETRY_MAX_DELAY", 4))):
+        """Bound retries by attempt count and an end-to-end deadline in seconds."""
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter for the given 1-based attempt number."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class RetryBudget:
+    def __init__(self,
+                 ratio: float = float(os.environ.get("RETRY_BUDGET_RATIO", 0.2)),
+                 reserve: float = float(os.environ.get("RETRY_BUDGET_RESERVE", 10))):
+        """Allow retries up to `ratio` of request volume, with at most `reserve` banked for bursts."""
+        self.ratio = ratio
+        self.reserve = reserve
+        self._tokens = reserve
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.rejected = 0
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self.reserve, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take one retry token; False means the budget is exhausted and the caller should give up."""
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.retries += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "rejected": self.rejected,
+                "tokens": round(self._tokens, 2),
+                "ratio": self.ratio
+            }
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Classify an exception raised by an attempt as retryable or fatal."""
+    if isinstance(error, RetryableError):
+        return True
+    if isinstance(error, FatalError):
+        return False
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    # Malformed model output or an error body without "choices"
+    if isinstance(error, (json.JSONDecodeError, KeyError, IndexError)):
+        return True
+    return False
+
+
+async def retry_call(fn: Callable[[], Awaitable[Any]],
+                     policy: RetryPolicy,
+                     budget: Optional[RetryBudget] = None,
+                     label: str = "Attempt") -> Tuple[Any, int]:
+    """Run fn until it succeeds, fails fatally, or runs out of attempts, deadline or budget.
+
+    Returns (result, attempts). If the last failure was an EmptyResultError its result is
+    returned instead of raising, so callers still get the (empty) answer.
+    """
+    if budget is not None:
+        budget.record_request()
+    deadline = time.monotonic() + policy.deadline
+    attempt = 0
+    while True:
+        attempt += 1
+        remaining = deadline - time.monotonic()
+        try:
+            result = await asyncio.wait_for(fn(), timeout=remaining)
+            RETRY_ATTEMPTS.observe(attempt, label)
+            return result, attempt
+        except Exception as e:
+            error = e
+        print(f"{label} {attempt} failed: {error!r}")
+        if isinstance(error, EmptyResultError):
+            EMPTY_RESULT_RETRIES.inc(label)
+
+        delay = policy.backoff(attempt)
+        give_up = (
+            not is_retryable(error)
+            or attempt >= policy.max_attempts
+            or time.monotonic() + delay >= deadline
+            or (budget is not None and not budget.try_spend())
+        )
+        if give_up:
+            RETRY_ATTEMPTS.observe(attempt, label)
+            if isinstance(error, EmptyResultError):
+                return error.result, attempt
+            raise error
+        await asyncio.sleep(delay)
@@ -0,0 +1,216 @@
+# Stores for shared locations
+import os
+import json
+import time
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from storage import data_path, connect_sqlite
+
+DEFAULT_TTL = float(os.environ.get("SHARED_LOCATIONS_TTL", 30 * 24 * 3600))
+
+
+class SharedLocationStore(ABC):
+    """Interface for shared location backends."""
+
+    @abstractmethod
+    def put(self, location_id: str, data: Dict[str, Any]) -> None:
+        """Store data under location_id, replacing any earlier entry."""
+
+    @abstractmethod
+    def get(self, location_id: str) -> Optional[Dict[str, Any]]:
+        """Return the live entry for location_id, or None if it is missing or expired."""
+
+    @abstractmethod
+    def list(self, offset: int = 0, limit: int = 50) -> Tuple[List[str], int]:
+        """Return one page of ids, newest first, and the total number of live entries."""
+
+
+class MemoryStore(SharedLocationStore):
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = 10000):
+        """Initialize a bounded in-process store; oldest entries are dropped first."""
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, location_id: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[location_id] = (time.time(), data)
+            self._entries.move_to_end(location_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, location_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(location_id)
+            if entry is None:
+                return None
+            created_at, data = entry
+            if time.time() - created_at > self.ttl:
+                del self._entries[location_id]
+                return None
+            return data
+
+    def list(self, offset: int = 0, limit: int = 50) -> Tuple[List[str], int]:
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            ids = [key for key, (created_at, _) in reversed(self._entries.items()) if created_at >= cutoff]
+        return ids[offset:offset + limit], len(ids)
+
+
+class SQLiteStore(SharedLocationStore):
+    def __init__(self,
+                 path: Optional[str] = None,
+                 ttl: float = DEFAULT_TTL,
+                 cache_size: int = 1024):
+        """Initialize a SQLite (WAL) store with an in-process LRU read-through cache."""
+        self.path = path or data_path("shared_locations.db")
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(self.path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared_locations ("
+            "id TEXT PRIMARY KEY, data TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS shared_locations_created_at ON shared_locations (created_at)"
+        )
+        self.purge_expired()
+
+    def put(self, location_id: str, data: Dict[str, Any]) -> None:
+        created_at = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO shared_locations (id, data, created_at) VALUES (?, ?, ?)",
+                (location_id, json.dumps(data), created_at)
+            )
+            self._remember(location_id, created_at, data)
+
+    def get(self, location_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._cache.get(location_id)
+            if entry is not None:
+                self._cache.move_to_end(location_id)
+            else:
+                row = self._conn.execute(
+                    "SELECT created_at, data FROM shared_locations WHERE id = ?", (location_id,)
+                ).fetchone()
+                if row is None:
+                    return None
+                entry = (row[0], json.loads(row[1]))
+                self._remember(location_id, *entry)
+            created_at, data = entry
+            if time.time() - created_at > self.ttl:
+                self._cache.pop(location_id, None)
+                self._conn.execute("DELETE FROM shared_locations WHERE id = ?", (location_id,))
+                return None
+            return data
+
+    def list(self, offset: int = 0, limit: int = 50) -> Tuple[List[str], int]:
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM shared_locations WHERE created_at >= ? "
+                "ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (cutoff, limit, offset)
+            ).fetchall()
+            total = self._conn.execute(
+                "SELECT COUNT(*) FROM shared_locations WHERE created_at >= ?", (cutoff,)
+            ).fetchone()[0]
+        return [row[0] for row in rows], total
+
+    def purge_expired(self) -> int:
+        """Delete expired rows and return how many were removed."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM shared_locations WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            return cursor.rowcount
+
+    def _remember(self, location_id: str, created_at: float, data: Dict[str, Any]) -> None:
+        self._cache[location_id] = (created_at, data)
+        self._cache.move_to_end(location_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+class FirestoreStore(SharedLocationStore):
+    def __init__(self,
+                 collection: str = "shared_locations",
+                 project: Optional[str] = None,
+                 ttl: float = DEFAULT_TTL,
+                 cache_size: int = 1024):
+        """Initialize a Firestore-backed store shared by every instance, with an in-process LRU read cache.
+
+        Needs google-cloud-firestore and application default credentials (automatic on App Engine).
+        Entries carry an `expires_at` timestamp, so a Firestore TTL policy on that field can delete
+        them server-side; expired entries are also ignored on read.
+        """
+        from google.cloud import firestore
+        self._firestore = firestore
+        self._collection = firestore.Client(project=project).collection(collection)
+        self.ttl = ttl
+        self.cache_size = cache_size
+        # Entries are never updated once written (ids are random), so a cached copy cannot go stale
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, location_id: str, data: Dict[str, Any]) -> None:
+        created_at = time.time()
+        self._collection.document(location_id).set({
+            "data": json.dumps(data),
+            "created_at": created_at,
+            "expires_at": datetime.fromtimestamp(created_at + self.ttl, timezone.utc)
+        })
+        with self._lock:
+            self._remember(location_id, created_at, data)
+
+    def get(self, location_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._cache.get(location_id)
+            if entry is not None:
+                self._cache.move_to_end(location_id)
+        if entry is None:
+            snapshot = self._collection.document(location_id).get()
+            if not snapshot.exists:
+                return None
+            fields = snapshot.to_dict()
+            entry = (fields["created_at"], json.loads(fields["data"]))
+            with self._lock:
+                self._remember(location_id, *entry)
+        created_at, data = entry
+        if time.time() - created_at > self.ttl:
+            return None
+        return data
+
+    def list(self, offset: int = 0, limit: int = 50) -> Tuple[List[str], int]:
+        live = self._collection.where(filter=self._firestore.FieldFilter("created_at", ">=", time.time() - self.ttl))
+        page = live.order_by("created_at", direction=self._firestore.Query.DESCENDING).offset(offset).limit(limit)
+        ids = [snapshot.id for snapshot in page.stream()]
+        total = live.count().get()[0][0].value
+        return ids, total
+
+    def _remember(self, location_id: str, created_at: float, data: Dict[str, Any]) -> None:
+        self._cache[location_id] = (created_at, data)
+        self._cache.move_to_end(location_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+def create_store() -> SharedLocationStore:
+    """Build the store selected by SHARED_LOCATIONS_BACKEND (sqlite, memory or firestore)."""
+    backend = os.environ.get("SHARED_LOCATIONS_BACKEND", "sqlite")
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "sqlite":
+        return SQLiteStore(os.environ.get("SHARED_LOCATIONS_DB"))
+    if backend == "firestore":
+        return FirestoreStore(os.environ.get("SHARED_LOCATIONS_COLLECTION", "shared_locations"),
+                              os.environ.get("GOOGLE_CLOUD_PROJECT"))
+    raise ValueError(f"Unknown SHARED_LOCATIONS_BACKEND: {backend}")
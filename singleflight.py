@@ -0,0 +1,107 @@
+# Single-flight coalescing of identical in-flight requests
+import asyncio
+from collections import Counter
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List
+
+
+class _Broadcast:
+    def __init__(self):
+        """Events published by one shared producer, replayed to each subscriber from the first."""
+        self.events: List[Any] = []
+        self.task: asyncio.Task = None
+        self._published = asyncio.Event()
+
+    def publish(self, event: Any) -> None:
+        self.events.append(event)
+        self.wake()
+
+    def wake(self) -> None:
+        published, self._published = self._published, asyncio.Event()
+        published.set()
+
+    async def replay(self) -> AsyncIterator[Any]:
+        seen = 0
+        while True:
+            published = self._published
+            while seen < len(self.events):
+                yield self.events[seen]
+                seen += 1
+            if self.task.done():
+                if not self.task.cancelled() and self.task.exception() is not None:
+                    raise self.task.exception()
+                return
+            await published.wait()
+
+
+class SingleFlight:
+    def __init__(self):
+        """Initialize an empty set of in-flight calls."""
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self._callers: Dict[Hashable, int] = {}
+        self.flights = 0
+        self.coalesced = 0
+        self.max_fold = 0
+        self.fold_sizes: Counter = Counter()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn once per key; concurrent callers with the same key await the same result."""
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            self._callers[key] = 1
+            self.flights += 1
+            task.add_done_callback(lambda t, key=key: self._finish(key, t))
+        else:
+            self._callers[key] += 1
+            self.coalesced += 1
+        # Shield so one caller disconnecting does not cancel the shared upstream call
+        return await asyncio.shield(task)
+
+    async def stream(self, key: Hashable, fn: Callable[[Callable[[Any], None]], Awaitable[Any]]) -> AsyncIterator[Any]:
+        """Run fn(publish) once per key; every concurrent caller iterates over all the events it publishes.
+
+        Callers that join late get the earlier events replayed first. As with do, a caller that stops
+        iterating does not cancel the shared producer, and an exception it raises reaches every caller.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = self._streams[key] = _Broadcast()
+            broadcast.task = asyncio.ensure_future(fn(broadcast.publish))
+            self._callers[key] = 1
+            self.flights += 1
+
+            def finish(task: asyncio.Task, key=key) -> None:
+                self._streams.pop(key, None)
+                self._finish(key, task)
+                broadcast.wake()
+
+            broadcast.task.add_done_callback(finish)
+        else:
+            self._callers[key] += 1
+            self.coalesced += 1
+        async for event in broadcast.replay():
+            yield event
+
+    def in_flight(self) -> int:
+        return len(self._flights) + len(self._streams)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return how many flights ran and how many callers were folded into them."""
+        return {
+            "flights": self.flights,
+            "coalesced_callers": self.coalesced,
+            "in_flight": self.in_flight(),
+            "max_callers_per_flight": self.max_fold,
+            "callers_per_flight": dict(sorted(self.fold_sizes.items()))
+        }
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        callers = self._callers.pop(key, 1)
+        self._flights.pop(key, None)
+        self.fold_sizes[callers] += 1
+        self.max_fold = max(self.max_fold, callers)
+        if not task.cancelled():
+            # Mark the exception as retrieved; callers that awaited it already re-raised it
+            task.exception()
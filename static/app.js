@@ -436,8 +436,60 @@ function fitMapToPins(data, userLat, userLng) {
     }
 }
 
+// Stream results as Server-Sent Events, creating each pin as soon as it arrives
+function streamLocalData(url, lat, lng) {
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(url);
+        let finished = false;
+        
+        source.addEventListener('poi', (event) => {
+            const { category, item } = JSON.parse(event.data);
+            createPinsFromData({ [category]: [item] }, lat, lng);
+            hideProgress();
+        });
+        
+        source.addEventListener('done', (event) => {
+            finished = true;
+            source.close();
+            const result = JSON.parse(event.data);
+            // Streamed items are raw; redraw from the final data, which is de-duplicated and has resolved coordinates
+            clearMarkers();
+            if (result.data) {
+                createPinsFromData(result.data, lat, lng);
+            }
+            resolve(result);
+        });
+        
+        source.onerror = () => {
+            if (!finished) {
+                source.close();
+                reject(new Error("Stream interrupted"));
+            }
+        };
+    });
+}
+
 // Load local data
 async function loadLocalData(lat, lng) {
+    if (window.EventSource) {
+        let result = null;
+        try {
+            result = await streamLocalData(`/api/local-data/stream?lat=${lat}&lng=${lng}`, lat, lng);
+        } catch (error) {
+            console.error("Streaming local data failed, retrying without streaming:", error);
+            clearMarkers();
+        }
+        
+        if (result) {
+            console.log("Perplexity structured data (streamed):", result);
+            if (!result.success || !result.data) {
+                throw new Error("No data received");
+            }
+            fitMapToPins(result.data, lat, lng);
+            return;
+        }
+    }
+    
     try {
         const response = await fetch(`/api/local-data?lat=${lat}&lng=${lng}`);
         const result = await response.json();
@@ -469,6 +521,35 @@ async function loadLocalData(lat, lng) {
 
 // Search for local data
 async function searchLocalData(lat, lng, query) {
+    if (window.EventSource) {
+        let result = null;
+        try {
+            const url = `/api/search-local/stream?lat=${lat}&lng=${lng}&query=${encodeURIComponent(query)}`;
+            result = await streamLocalData(url, lat, lng);
+        } catch (error) {
+            console.error("Streaming search failed, retrying without streaming:", error);
+            clearMarkers();
+        }
+        
+        if (result) {
+            console.log("Search results (streamed):", result);
+            if (!result.success || !result.data) {
+                alert('Search failed. Please try again.');
+                return;
+            }
+            fitMapToPins(result.data, lat, lng);
+            
+            const totalResults = (result.data.events?.length || 0) + 
+                                (result.data.restaurants?.length || 0) + 
+                                (result.data.alerts?.length || 0);
+            
+            if (totalResults === 0) {
+                alert(`No results found for "${query}". Try a different search term.`);
+            }
+            return;
+        }
+    }
+    
     try {
         const response = await fetch(`/api/search-local?lat=${lat}&lng=${lng}&query=${encodeURIComponent(query)}`);
         const result = await response.json();
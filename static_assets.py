@@ -0,0 +1,134 @@
+# Fingerprinted, precompressed static assets held in memory
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+from typing import Dict, List, Optional, Tuple
+
+from fasthtml.common import Response
+
+from page_cache import etag_matches
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml", "image/x-icon",
+                      "image/vnd.microsoft.icon")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into {coding: q}."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+class Asset:
+    def __init__(self, content: bytes, content_type: str, digest: str):
+        self.content_type = content_type
+        self.size = len(content)
+        self.digest = digest
+        # Smallest first, so negotiation picks the best encoding the client accepts
+        self.variants: List[Tuple[str, bytes]] = [("identity", content)]
+        if content_type.startswith(COMPRESSIBLE_TYPES) and len(content) >= 512:
+            compressed = [("gzip", gzip.compress(content, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                compressed.append(("br", brotli.compress(content, quality=11)))
+            self.variants += [(coding, data) for coding, data in compressed if len(data) < len(content)]
+        self.variants.sort(key=lambda variant: len(variant[1]))
+
+    def etag(self, coding: str) -> str:
+        """Strong ETag per representation, since each encoding is a different byte sequence."""
+        return f'"{self.digest}"' if coding == "identity" else f'"{self.digest}-{coding}"'
+
+    def negotiate(self, accept_encoding: str) -> Tuple[str, bytes]:
+        accepted = accepted_encodings(accept_encoding)
+        for coding, data in self.variants:
+            if coding == "identity" or accepted.get(coding, accepted.get("*", 0)) > 0:
+                return coding, data
+        return self.variants[0]
+
+
+class StaticAssets:
+    def __init__(self, directory: str = "static", prefix: str = "/static"):
+        """Load every file under `directory`, fingerprint it and precompress text assets.
+
+        Each file is served both under its own name (revalidated with its ETag) and under a
+        content-hashed name such as app.3f2a9c1d04.js that can be cached forever.
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self._assets: Dict[str, Tuple[Asset, bool]] = {}
+        self._urls: Dict[str, str] = {}
+        self.build()
+
+    def build(self) -> None:
+        assets, urls = {}, {}
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    content = f.read()
+                digest = hashlib.sha256(content).hexdigest()[:10]
+                content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                asset = Asset(content, content_type, digest)
+                stem, ext = os.path.splitext(name)
+                hashed = f"{stem}.{digest}{ext}"
+                assets[name] = (asset, False)
+                assets[hashed] = (asset, True)
+                urls[f"{self.prefix}/{name}"] = f"{self.prefix}/{hashed}"
+        self._assets, self._urls = assets, urls
+
+    def url(self, path: str) -> str:
+        """Map /static/app.js to its fingerprinted URL, or return the path unchanged if unknown."""
+        return self._urls.get(path, path)
+
+    def rewrite_html(self, html: str) -> str:
+        """Point every src/href attribute that names a known static file at its fingerprinted URL."""
+        prefix = re.escape(self.prefix)
+        return re.sub(rf'((?:src|href)=")({prefix}/[^"?#]+)(")',
+                      lambda match: match.group(1) + self.url(match.group(2)) + match.group(3), html)
+
+    def response(self, request, name: str) -> Optional[Response]:
+        """Serve a static file by name, or None if it is not a known asset."""
+        entry = self._assets.get(name)
+        if entry is None:
+            return None
+        asset, hashed = entry
+        coding, data = asset.negotiate(request.headers.get("accept-encoding", ""))
+        etag = asset.etag(coding)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE if hashed else "no-cache",
+            "Vary": "Accept-Encoding"
+        }
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return Response(data, media_type=asset.content_type, headers=headers)
+
+    def stats(self) -> Dict[str, int]:
+        files = [asset for asset, hashed in self._assets.values() if not hashed]
+        return {
+            "files": len(files),
+            "bytes": sum(asset.size for asset in files),
+            "compressed_bytes": sum(len(asset.variants[0][1]) for asset in files)
+        }
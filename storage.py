@@ -0,0 +1,22 @@
+# On-disk storage helpers shared by the persistent caches and stores
+import os
+import sqlite3
+
+DATA_DIR = os.environ.get("CITYPULSE_DATA_DIR", "data")
+
+
+def data_path(filename: str) -> str:
+    """Return a path inside the data directory, creating the directory if needed."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, filename)
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """Open a SQLite database in WAL mode so several processes can read while one writes."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,73 @@
+# Incremental parser for streamed LOCAL_INFO_SCHEMA completions
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class PoiStreamParser:
+    """Emit each complete item of the top-level category arrays as soon as its closing brace arrives.
+
+    Expects a document shaped like {"events": [{...}, ...], "restaurants": [...], "alerts": [...]},
+    fed in arbitrary text chunks. Anything before the first "{" (e.g. a code fence) is ignored.
+    """
+
+    def __init__(self):
+        self.text: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key: List[str] = []
+        self._category: Optional[str] = None
+        self._item: List[str] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Consume a chunk and return the (category, item) pairs it completed."""
+        self.text.append(chunk)
+        items = []
+        for char in chunk:
+            if self._depth == 0 and char != "{":
+                continue
+            capturing = self._depth >= 3
+            if capturing:
+                self._item.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._category = "".join(self._key)
+                elif self._depth == 1:
+                    self._key.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._key = []
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 3 and char == "{":
+                    self._item = [char]
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 2 and char == "}" and self._category:
+                    try:
+                        items.append((self._category, json.loads("".join(self._item))))
+                    except json.JSONDecodeError:
+                        pass
+                    self._item = []
+        return items
+
+    def document(self) -> Optional[Dict[str, Any]]:
+        """Parse everything fed so far as one JSON document, or None if it is incomplete."""
+        text = "".join(self.text)
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end == -1:
+            return None
+        try:
+            return json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            return None
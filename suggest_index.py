@@ -0,0 +1,198 @@
+# Per-area prefix index of search terms for autocomplete
+import os
+import gzip
+import json
+import time
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from geo_cache import geocell, normalize_query
+
+
+class SuggestIndex:
+    def __init__(self,
+                 precision: int = 1,
+                 half_life: float = 7 * 24 * 3600,
+                 max_terms: int = 2000,
+                 backfill_ttl: float = 24 * 3600,
+                 min_results: int = 3):
+        """Index terms per coarse geocell (precision 1 is roughly 11km) in sorted arrays for bisect prefix lookup.
+
+        Terms are ranked by a frequency score that halves every `half_life` seconds, so recent
+        queries outrank old ones. A prefix is cold when it has fewer than `min_results` matches
+        and no recent upstream backfill covers it.
+        """
+        self.precision = precision
+        self.half_life = half_life
+        self.max_terms = max_terms
+        self.backfill_ttl = backfill_ttl
+        self.min_results = min_results
+        # cell -> sorted normalized terms, and cell -> term -> [display, score, last_seen]
+        self._terms: Dict[str, List[str]] = {}
+        self._stats: Dict[str, Dict[str, list]] = {}
+        # cell -> prefix -> (fetched_at, suggestions) for prefixes answered by the upstream
+        self._backfills: Dict[str, Dict[str, Tuple[float, List[str]]]] = {}
+        self._lock = threading.Lock()
+        self.dirty = False
+        self._saved_at = time.time()
+        self.hits = 0
+        self.misses = 0
+
+    def cell(self, lat: float, lng: float) -> str:
+        return geocell(lat, lng, self.precision)
+
+    def _score(self, score: float, last_seen: float, now: float) -> float:
+        return score * 0.5 ** ((now - last_seen) / self.half_life)
+
+    def record(self, lat: float, lng: float, term: str, weight: float = 1.0, now: Optional[float] = None) -> None:
+        """Count one use of a term in the area around (lat, lng)."""
+        key = normalize_query(term)
+        if not key:
+            return
+        now = now or time.time()
+        cell = self.cell(lat, lng)
+        with self._lock:
+            terms = self._terms.setdefault(cell, [])
+            stats = self._stats.setdefault(cell, {})
+            entry = stats.get(key)
+            if entry is None:
+                insort(terms, key)
+                stats[key] = [" ".join(term.split()), weight, now]
+                if len(terms) > self.max_terms:
+                    self._evict(cell, now)
+            else:
+                entry[1] = self._score(entry[1], entry[2], now) + weight
+                entry[2] = now
+            self.dirty = True
+
+    def _evict(self, cell: str, now: float) -> None:
+        stats = self._stats[cell]
+        weakest = min(stats, key=lambda key: self._score(stats[key][1], stats[key][2], now))
+        del stats[weakest]
+        terms = self._terms[cell]
+        del terms[bisect_left(terms, weakest)]
+
+    def suggest(self, lat: float, lng: float, prefix: str, limit: int = 5) -> List[str]:
+        """Return up to `limit` indexed terms starting with prefix, best first."""
+        key = normalize_query(prefix)
+        cell = self.cell(lat, lng)
+        now = time.time()
+        with self._lock:
+            terms = self._terms.get(cell, [])
+            stats = self._stats.get(cell, {})
+            matches = []
+            for i in range(bisect_left(terms, key), len(terms)):
+                if not terms[i].startswith(key):
+                    break
+                entry = stats[terms[i]]
+                matches.append((self._score(entry[1], entry[2], now), entry[0]))
+        matches.sort(key=lambda match: -match[0])
+        return [display for _, display in matches[:limit]]
+
+    def backfilled(self, lat: float, lng: float, prefix: str) -> Optional[List[str]]:
+        """Return the upstream suggestions for this exact prefix if they are still fresh."""
+        entry = self._backfills.get(self.cell(lat, lng), {}).get(normalize_query(prefix))
+        if entry is None or time.time() - entry[0] > self.backfill_ttl:
+            return None
+        return entry[1]
+
+    def lookup(self, lat: float, lng: float, prefix: str, limit: int = 5) -> Tuple[List[str], bool]:
+        """Return (suggestions, cold) for a prefix; cold means the upstream should be asked to backfill it."""
+        matches = self.suggest(lat, lng, prefix, limit)
+        backfill = self.backfilled(lat, lng, prefix)
+        cold = self._is_cold(lat, lng, prefix, matches, backfill)
+        if backfill:
+            seen = {normalize_query(match) for match in matches}
+            matches += [suggestion for suggestion in backfill if normalize_query(suggestion) not in seen]
+        if cold:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return matches[:limit], cold
+
+    def _is_cold(self, lat: float, lng: float, prefix: str, matches: List[str], backfill: Optional[List[str]]) -> bool:
+        # Warm if there are enough matches, the prefix itself was backfilled, or a shorter prefix
+        # was backfilled recently and the index still has something for this one
+        if len(matches) >= self.min_results or backfill is not None:
+            return False
+        if not matches:
+            return True
+        key = normalize_query(prefix)
+        now = time.time()
+        with self._lock:
+            backfills = list(self._backfills.get(self.cell(lat, lng), {}).items())
+        return not any(
+            key.startswith(known) and now - fetched_at <= self.backfill_ttl
+            for known, (fetched_at, _) in backfills
+        )
+
+    def add_backfill(self, lat: float, lng: float, prefix: str, suggestions: List[str], weight: float = 0.5) -> None:
+        """Remember upstream suggestions for a prefix and index them at a lower weight than real queries."""
+        for suggestion in suggestions:
+            self.record(lat, lng, suggestion, weight)
+        with self._lock:
+            backfills = self._backfills.setdefault(self.cell(lat, lng), {})
+            backfills[normalize_query(prefix)] = (time.time(), list(suggestions))
+            if len(backfills) > self.max_terms:
+                del backfills[min(backfills, key=lambda known: backfills[known][0])]
+            self.dirty = True
+
+    def save(self, path: str) -> None:
+        """Write a gzipped JSON snapshot atomically."""
+        with self._lock:
+            snapshot = {
+                "version": 1,
+                "precision": self.precision,
+                "cells": {cell: list(stats.values()) for cell, stats in self._stats.items()},
+                "backfills": {cell: {prefix: list(entry) for prefix, entry in backfills.items()}
+                              for cell, backfills in self._backfills.items()}
+            }
+            self.dirty = False
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def maybe_save(self, path: str, interval: float) -> bool:
+        """Save if there are changes and the last snapshot is older than `interval` seconds."""
+        with self._lock:
+            if not self.dirty or time.time() - self._saved_at < interval:
+                return False
+            self._saved_at = time.time()
+        self.save(path)
+        return True
+
+    def load(self, path: str) -> int:
+        """Load a snapshot written by save(); returns the number of terms loaded."""
+        if not os.path.exists(path):
+            return 0
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable suggestion snapshot {path}: {e!r}")
+            return 0
+        if snapshot.get("version") != 1 or snapshot.get("precision") != self.precision:
+            return 0
+        loaded = 0
+        with self._lock:
+            for cell, entries in snapshot.get("cells", {}).items():
+                stats = {normalize_query(display): [display, score, last_seen] for display, score, last_seen in entries}
+                self._stats[cell] = stats
+                self._terms[cell] = sorted(stats)
+                loaded += len(stats)
+            for cell, backfills in snapshot.get("backfills", {}).items():
+                self._backfills[cell] = {prefix: (fetched_at, suggestions)
+                                         for prefix, (fetched_at, suggestions) in backfills.items()}
+        return loaded
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "cells": len(self._terms),
+                "terms": sum(len(terms) for terms in self._terms.values()),
+                "backfilled_prefixes": sum(len(backfills) for backfills in self._backfills.values()),
+                "hits": self.hits,
+                "misses": self.misses
+            }
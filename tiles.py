@@ -0,0 +1,62 @@
+# Slippy-map (Web Mercator XYZ) tile math for viewport queries
+import math
+from typing import List, Tuple
+
+# Web Mercator stops short of the poles
+MAX_LATITUDE = 85.05112878
+
+
+def tile_for(lat: float, lng: float, zoom: int) -> Tuple[int, int]:
+    """Return the (x, y) of the tile containing a point at `zoom`."""
+    n = 2 ** zoom
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(x: int, y: int, zoom: int) -> Tuple[float, float, float, float]:
+    """Return (south, west, north, east) of a tile."""
+    n = 2 ** zoom
+
+    def latitude(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return latitude(y + 1), x / n * 360.0 - 180.0, latitude(y), (x + 1) / n * 360.0 - 180.0
+
+
+def tile_center(x: int, y: int, zoom: int) -> Tuple[float, float]:
+    south, west, north, east = tile_bounds(x, y, zoom)
+    return (south + north) / 2, (west + east) / 2
+
+
+def tiles_in_bbox(south: float, west: float, north: float, east: float, zoom: int) -> List[Tuple[int, int]]:
+    """Tiles covering a bounding box, nearest to its center first; west > east means it crosses the antimeridian."""
+    n = 2 ** zoom
+    x0, y0 = tile_for(north, west, zoom)
+    x1, y1 = tile_for(south, east, zoom)
+    columns = range(x0, x1 + 1) if x0 <= x1 else [x % n for x in range(x0, x1 + n + 1)]
+    rows = range(min(y0, y1), max(y0, y1) + 1)
+    center_x = (x0 + (x1 if x0 <= x1 else x1 + n)) / 2
+    center_y = (y0 + y1) / 2
+
+    def distance(tile: Tuple[int, int]) -> float:
+        x = tile[0] if tile[0] >= x0 else tile[0] + n
+        return (x - center_x) ** 2 + (tile[1] - center_y) ** 2
+
+    return sorted(((x, y) for x in columns for y in rows), key=distance)
+
+
+def tile_count(south: float, west: float, north: float, east: float, zoom: int) -> int:
+    """How many tiles `tiles_in_bbox` would return, without listing them."""
+    n = 2 ** zoom
+    x0, y0 = tile_for(north, west, zoom)
+    x1, y1 = tile_for(south, east, zoom)
+    columns = x1 - x0 + 1 if x0 <= x1 else x1 + n - x0 + 1
+    return columns * (abs(y1 - y0) + 1)
+
+
+def in_bbox(lat: float, lng: float, south: float, west: float, north: float, east: float) -> bool:
+    if not south <= lat <= north:
+        return False
+    return west <= lng <= east if west <= east else (lng >= west or lng <= east)